@@ -0,0 +1,121 @@
+"""End-to-end benchmark of `BiorxivDataGenerator` against the local mock API server.
+
+The mock server runs in its own process, and every scenario in a fresh process, so that the peak RSS
+reported is the one of that crawl alone. For each combination of workers and output format it reports
+pages/sec, records/sec, peak RSS and the time spent deduplicating records, which includes the
+overhead of timing each call.
+
+Usage:
+    ```bash
+    python -m benchmarks.bench_crawl --papers 50000 --latency 0.02 --workers 1 4 8 --output_format json jsonl
+    python -m benchmarks.bench_crawl --server biorxiv medrxiv --workers 4
+    ```
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from benchmarks.mock_server import MockBiorxivServer
+
+
+def serve(queue: multiprocessing.Queue, **kwargs) -> None:
+    mock = MockBiorxivServer(**kwargs)
+    queue.put((mock.api_url, len(mock.records)))
+    mock.serve_forever()
+
+
+def crawl(queue: multiprocessing.Queue, api_url: str, server: list, workers: int, output_format: str, shard: str,
+          start_date: str, end_date: str) -> None:
+    """Runs one crawl and puts its measurements in `queue`. Meant to run in its own process."""
+    from src.dataset_generator import BiorxivDataGenerator
+    from src.dedup import Deduplicator
+    from src.requester import configure_rate_limiter
+
+    configure_rate_limiter(rate=1e6, burst=1000)
+    dedup = {"seconds": 0.0, "calls": 0}
+    accept = Deduplicator.accept
+
+    def timed_accept(self, paper):
+        start = time.perf_counter()
+        try:
+            return accept(self, paper)
+        finally:
+            dedup["seconds"] += time.perf_counter() - start
+            dedup["calls"] += 1
+
+    Deduplicator.accept = timed_accept
+
+    class CountingGenerator(BiorxivDataGenerator):
+        pages = 0
+        records = 0
+
+        def _fetch_page(self, *args):
+            response = super()._fetch_page(*args)
+            self.pages += 1
+            self.records += len(response['collection'])
+            return response
+
+    with tempfile.TemporaryDirectory() as save_folder:
+        generator = CountingGenerator(api_url=api_url, server=server, start_date=start_date, end_date=end_date,
+                                      save_folder=save_folder, filename=f"bench.{output_format}",
+                                      workers=workers, output_format=output_format, shard=shard)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator()
+        elapsed = time.perf_counter() - start
+    queue.put({"seconds": elapsed, "pages": generator.pages, "records": generator.records,
+               "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+               "dedup_seconds": dedup["seconds"], "dedup_calls": dedup["calls"]})
+
+
+def run_in_process(target, *args) -> dict:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(queue, *args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the crawl against a local mock bioRxiv API",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--papers', type=int, default=20000, help="Number of distinct papers in the mock corpus.")
+    parser.add_argument('--duplicate_rate', type=float, default=0.2, help="Share of papers with a second version.")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds waited by the server per request.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Share of requests answered with a 500.")
+    parser.add_argument('--workers', type=int, nargs="+", default=[1, 4, 8],
+                        help="Number of pages fetched concurrently, one run per value.")
+    parser.add_argument('--output_format', nargs="+", default=["json", "jsonl"], choices=["json", "jsonl"],
+                        help="Output formats, one run per value.")
+    parser.add_argument('--server', nargs="+", default=["biorxiv"], choices=["biorxiv", "medrxiv"],
+                        help="Servers crawled, concurrently if several.")
+    parser.add_argument('--shard', default=None, choices=["month", "week"], help="Date windows of the crawl.")
+    args = parser.parse_args()
+
+    server_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(server_queue,), daemon=True,
+                                     kwargs=dict(papers=args.papers, duplicate_rate=args.duplicate_rate,
+                                                 latency=args.latency, error_rate=args.error_rate))
+    server.start()
+    api_url, served = server_queue.get()
+    print(f"Mock server at {api_url} with {served} records, {os.cpu_count()} CPUs")
+
+    print(f"{'workers':>8} {'format':>7} {'pages':>7} {'records':>8} {'seconds':>8} {'pages/s':>8} "
+          f"{'records/s':>10} {'peak MiB':>9} {'dedup ns/rec':>13}")
+    try:
+        for output_format in args.output_format:
+            for workers in args.workers:
+                result = run_in_process(crawl, api_url, args.server, workers, output_format, args.shard,
+                                        "2021-01-01", "2021-12-31")
+                seconds = result["seconds"]
+                print(f"{workers:>8} {output_format:>7} {result['pages']:>7} {result['records']:>8} "
+                      f"{seconds:>8.2f} {result['pages'] / seconds:>8.1f} {result['records'] / seconds:>10.0f} "
+                      f"{result['peak_rss_mib']:>9.1f} "
+                      f"{1e9 * result['dedup_seconds'] / max(result['dedup_calls'], 1):>13.0f}")
+    finally:
+        server.terminate()
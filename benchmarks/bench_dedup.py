@@ -0,0 +1,68 @@
+"""Micro-benchmark of the deduplication of paper records.
+
+Feeds synthetic records, with about one paper in five having a second version, through `Deduplicator`
+for each policy and reports the time per record, which should stay flat as the corpus grows.
+The former list-based lookup is timed on the smaller sizes for comparison.
+
+Usage:
+    ```bash
+    python -m benchmarks.bench_dedup --sizes 10000 100000 1000000
+    ```
+"""
+import argparse
+import time
+from src.dedup import POLICIES, Deduplicator
+
+
+def synthetic_records(n: int) -> list:
+    records = []
+    for i in range(n):
+        doi = f"10.1101/{i - i // 5 if i % 5 == 4 else i:09d}"
+        records.append({"doi": doi, "version": str(2 if i % 5 == 4 else 1)})
+    return records
+
+
+def list_lookup(history: dict, new: dict) -> dict:
+    """Lookup through `list(history.keys())`, as done before `Deduplicator`."""
+    if new["doi"] not in list(history.keys()):
+        history[new["doi"]] = new
+    elif int(new["version"]) > int(history[new["doi"]]["version"]):
+        history[new["doi"]] = new
+    return history
+
+
+def time_deduplicator(records: list, policy: str) -> float:
+    dataset = {}
+    dedup = Deduplicator(policy)
+    start = time.perf_counter()
+    for paper in records:
+        if dedup.accept(paper):
+            dataset[dedup.key(paper)] = paper
+    return time.perf_counter() - start
+
+
+def time_list_lookup(records: list) -> float:
+    dataset = {}
+    start = time.perf_counter()
+    for paper in records:
+        dataset = list_lookup(dataset, paper)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of paper deduplication",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="Number of synthetic records for each run.")
+    parser.add_argument('--list_lookup_max', type=int, default=20000,
+                        help="Largest size for which the former list-based lookup is timed.")
+    args = parser.parse_args()
+
+    print(f"{'records':>10} {'method':>12} {'seconds':>10} {'ns/record':>10}")
+    for size in args.sizes:
+        records = synthetic_records(size)
+        timings = [(policy, time_deduplicator(records, policy)) for policy in POLICIES]
+        if size <= args.list_lookup_max:
+            timings.append(("list lookup", time_list_lookup(records)))
+        for method, seconds in timings:
+            print(f"{size:>10} {method:>12} {seconds:>10.3f} {1e9 * seconds / size:>10.0f}")
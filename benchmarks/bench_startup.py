@@ -0,0 +1,84 @@
+"""Startup time of the command line tools.
+
+Every command runs in a fresh interpreter, `repeat` times, and the median and fastest wall times are reported.
+The reference rows are a bare interpreter and the eager import of the crawl modules, which the CLIs only do
+after their arguments are parsed. `--help` and a search of a small local index should stay within a few tens
+of milliseconds of the bare interpreter. The console scripts are measured as well when they are installed,
+with `pip install -e .`.
+
+Usage:
+    ```bash
+    python -m benchmarks.bench_startup --repeat 20
+    ```
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+CLIS = ["search", "create_data", "export", "query"]
+SCRIPTS = {"search": "biorxiv-search", "create_data": "biorxiv-create-data", "export": "biorxiv-export",
+           "query": "biorxiv-query"}
+HEAVY_MODULES = ["requests", "urllib3", "json", "pyarrow", "orjson", "ijson", "aiohttp"]
+
+
+def measure(command: List[str], repeat: int) -> List[float]:
+    """Returns the wall time in milliseconds of `repeat` runs of `command`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(1000 * (time.perf_counter() - start))
+    return times
+
+
+def loaded_modules(cli: str, argv: List[str]) -> List[str]:
+    """Returns the heavy modules imported by running `cli` with `argv`."""
+    code = (f"import sys\nsys.argv = ['{cli}'] + {argv!r}\nfrom src.cli.{cli}.{cli} import main\n"
+            f"try:\n    main()\nexcept SystemExit:\n    pass\n"
+            f"sys.stderr.write(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    return [module for module in result.stderr.strip().split(",") if module]
+
+
+def build_index(filename: str, papers: int) -> None:
+    from benchmarks.mock_server import synthetic_corpus
+    from src.local_index import LocalIndex
+    index = LocalIndex(filename)
+    index.add(synthetic_corpus(papers, abstract_words=50))
+    index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time of the command line tools",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help="Runs of every command.")
+    parser.add_argument('--papers', type=int, default=10000, help="Papers in the local index searched.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        index = os.path.join(folder, "index.sqlite")
+        build_index(index, args.papers)
+        commands = [("python -c pass", [sys.executable, "-c", "pass"], None),
+                    ("import src.dataset_generator", [sys.executable, "-c", "import src.dataset_generator"], None)]
+        for cli in CLIS:
+            commands.append((f"{cli} --help", [sys.executable, "-m", f"src.cli.{cli}.{cli}", "--help"],
+                             (cli, ["--help"])))
+        search = ["--index", index, "search", "virus", "--limit", "5"]
+        commands.append(("query search", [sys.executable, "-m", "src.cli.query.query"] + search, ("query", search)))
+        for cli in CLIS:
+            script = shutil.which(SCRIPTS[cli])
+            if script is not None:
+                commands.append((f"{SCRIPTS[cli]} --help", [script, "--help"], None))
+
+        print(f"{'command':>30} {'median ms':>10} {'min ms':>8}  heavy modules loaded")
+        for name, command, cli in commands:
+            times = measure(command, args.repeat)
+            modules = ", ".join(loaded_modules(*cli)) if cli else ""
+            print(f"{name:>30} {statistics.median(times):>10.1f} {min(times):>8.1f}  {modules}")
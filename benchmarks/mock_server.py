@@ -0,0 +1,258 @@
+"""Local stand-in for the bioRxiv API, used by the benchmarks.
+
+Serves a synthetic corpus on the `details`, `pubs`, `pub`, `publisher`, `sum` and `usage` endpoints with the
+same URL layout and response shape as https://api.biorxiv.org/, plus the JATS XML of every paper. The
+corpus size, the share of papers with a second version, the latency and the error rate are configurable.
+`/__stats` returns the number of requests served and errors injected.
+
+Usage:
+    ```bash
+    python -m benchmarks.mock_server --papers 100000 --latency 0.05 --error_rate 0.01 --port 8765
+    python -m src.cli.create_data.create_data biorxiv --api_url=http://127.0.0.1:8765/ --start_date=2021-01-01
+    ```
+    ```python
+    with MockBiorxivServer(papers=20000, latency=0.02) as server:
+        BiorxivDataGenerator(api_url=server.api_url, start_date="2021-01-01", end_date="2021-12-31")()
+    ```
+"""
+import argparse
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlparse
+
+PAGE_SIZE = 100
+SERVERS = ["biorxiv", "medrxiv"]
+CATEGORIES = ["bioinformatics", "cell biology", "genomics", "microbiology", "neuroscience", "epidemiology"]
+WORDS = ["cell", "gene", "protein", "neuron", "sequencing", "expression", "model", "virus", "structure", "network"]
+
+
+def synthetic_corpus(papers: int, duplicate_rate: float = 0.2, published_rate: float = 0.3,
+                     start_date: str = "2021-01-01", days: int = 365, abstract_words: int = 200,
+                     xml_url: str = "https://www.biorxiv.org/", seed: int = 0) -> List[dict]:
+    """Returns `papers` synthetic records posted over `days` days, plus a second version for a share
+    `duplicate_rate` of them, posted a few days after the first one. Records are sorted by posting date.
+    Their 'jatsxml' links point to `xml_url`."""
+    rng = random.Random(seed)
+    first_day = date.fromisoformat(start_date)
+    records = []
+    for i in range(papers):
+        posted = first_day + timedelta(days=rng.randrange(days))
+        server = SERVERS[i % len(SERVERS)]
+        doi = f"10.1101/{posted.isoformat().replace('-', '.')}.{i:06d}"
+        published = f"10.{rng.randrange(1000, 9999)}/j.{i}" if rng.random() < published_rate else "NA"
+        paper = {"doi": doi, "title": " ".join(rng.choices(WORDS, k=8)).capitalize(),
+                 "authors": "; ".join(f"Author{rng.randrange(10000)}, A." for _ in range(rng.randint(1, 8))),
+                 "author_corresponding": f"Author{i}", "author_corresponding_institution": "Institute",
+                 "date": posted.isoformat(), "version": "1", "type": "new results", "license": "cc_by",
+                 "category": rng.choice(CATEGORIES), "jatsxml": f"{xml_url}xml/{doi}.source.xml",
+                 "abstract": " ".join(rng.choices(WORDS, k=abstract_words)), "published": published,
+                 "server": server}
+        records.append(paper)
+        if rng.random() < duplicate_rate:
+            revised = (posted + timedelta(days=rng.randint(1, 30))).isoformat()
+            records.append({**paper, "version": "2", "date": revised, "type": "revision"})
+    records.sort(key=lambda paper: paper["date"])
+    return records
+
+
+class MockBiorxivServer:
+    """
+    Threaded HTTP server answering like the bioRxiv API from a synthetic corpus.
+    It runs in a daemon thread of the current process, or in the foreground with `serve_forever`.
+    """
+    def __init__(self, papers: int = 10000, duplicate_rate: float = 0.2, latency: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 seed: int = 0, **corpus_kwargs):
+        """
+        Parameters
+        ----------
+        papers : int, optional
+            Number of distinct papers in the corpus.
+        duplicate_rate : float, optional
+            Share of the papers with a second version.
+        latency : float, optional
+            Seconds waited before answering each request.
+        error_rate : float, optional
+            Share of the requests answered with a 500 error.
+        throttle_rate : float, optional
+            Share of the requests answered with a 429 and a 'Retry-After: 1' header.
+        host : str, optional
+            Interface to listen on.
+        port : int, optional
+            Port to listen on. Defaults to 0, any free port.
+        seed : int, optional
+            Seed of the corpus and of the injected errors.
+        corpus_kwargs
+            Further arguments of `synthetic_corpus`.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+        self.records = synthetic_corpus(papers, duplicate_rate=duplicate_rate, xml_url=self.api_url, seed=seed,
+                                        **corpus_kwargs)
+        self._by_server: Dict[str, List[dict]] = defaultdict(list)
+        self._by_doi: Dict[str, List[dict]] = defaultdict(list)
+        for paper in self.records:
+            self._by_server[paper["server"]].append(paper)
+            self._by_doi[paper["doi"]].append(paper)
+        self._dates = {server: [paper["date"] for paper in papers_] for server, papers_ in self._by_server.items()}
+        self._published = [paper for paper in self.records if paper["published"] != "NA"]
+        self._published_dates = [paper["date"] for paper in self._published]
+
+    @property
+    def api_url(self) -> str:
+        """Root URL to pass as `api_url` to the retriever, the data generator or the async client."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "MockBiorxivServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body, headers = server.answer(urlparse(self.path).path)
+                self.send_response(status)
+                for key, value in {"Content-Length": str(len(body)), **headers}.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def answer(self, url_path: str):
+        """Returns the status, body and extra headers of the response to `url_path`."""
+        parts = url_path.strip("/").split("/")
+        if parts[0] == "__stats":
+            with self._lock:
+                return 200, json.dumps(self.stats).encode(), {"Content-Type": "application/json"}
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["requests"] += 1
+            draw = self._random.random()
+            if draw < self.error_rate:
+                self.stats["errors"] += 1
+                return 500, b"Internal Server Error", {}
+            if draw < self.error_rate + self.throttle_rate:
+                self.stats["throttled"] += 1
+                return 429, b"Too Many Requests", {"Retry-After": "1"}
+        if parts[0] == "xml":
+            with self._lock:
+                self.stats["xml"] += 1
+            doi = "/".join(parts[1:]).replace(".source.xml", "")
+            return 200, f"<article><doi>{doi}</doi></article>".encode(), {"Content-Type": "application/xml"}
+        try:
+            response = self.route(parts)
+        except (IndexError, KeyError, ValueError):
+            return 404, b"Not Found", {}
+        with self._lock:
+            self.stats["records"] += len(response.get("collection", []))
+        return 200, json.dumps(response).encode(), {"Content-Type": "application/json"}
+
+    def route(self, parts: List[str]) -> dict:
+        service = parts[0]
+        if service in ["details", "pubs"]:
+            server_name = parts[1].lower()
+            if parts[2].startswith("10."):
+                papers = [paper for paper in self._by_doi.get(f"{parts[2]}/{parts[3]}", [])
+                          if paper["server"] == server_name]
+                if service == "pubs":
+                    papers = [self._pubs_record(paper) for paper in papers if paper["published"] != "NA"]
+                return self._page(papers, 0, len(papers))
+            start_date, end_date, cursor = parts[2], parts[3], int(parts[4])
+            if service == "details":
+                papers, dates = self._by_server[server_name], self._dates[server_name]
+            else:
+                papers = [paper for paper in self._published if paper["server"] == server_name]
+                dates = [paper["date"] for paper in papers]
+            return self._window(papers, dates, start_date, end_date, cursor, service == "pubs")
+        if service == "pub":
+            return self._window(self._published, self._published_dates, parts[1], parts[2], int(parts[3]), True)
+        if service == "publisher":
+            prefix = parts[1]
+            papers = [paper for paper in self._published if paper["published"].startswith(prefix)]
+            return self._window(papers, [paper["date"] for paper in papers], parts[2], parts[3], int(parts[4]), True)
+        if service in ["sum", "usage"]:
+            interval = parts[1]
+            return {"messages": {"status": "ok", "interval": interval},
+                    f"bioRxiv {'content' if service == 'sum' else 'usage'} statistics":
+                        [{"month": month, "new_papers": count_} for month, count_ in self._monthly().items()]}
+        raise KeyError(service)
+
+    def _window(self, papers: List[dict], dates: List[str], start_date: str, end_date: str, cursor: int,
+                pubs: bool) -> dict:
+        selected = papers[bisect_left(dates, start_date):bisect_right(dates, end_date)]
+        page = selected[cursor:cursor + PAGE_SIZE]
+        if pubs:
+            page = [self._pubs_record(paper) for paper in page]
+        return self._page(page, cursor, len(selected), f"{start_date}/{end_date}")
+
+    @staticmethod
+    def _page(collection: List[dict], cursor: int, total: int, interval: str = "") -> dict:
+        status = "ok" if collection else "no posts found"
+        return {"messages": [{"status": status, "interval": interval, "cursor": cursor,
+                              "count": len(collection), "total": total}],
+                "collection": collection}
+
+    @staticmethod
+    def _pubs_record(paper: dict) -> dict:
+        return {"biorxiv_doi": paper["doi"], "published_doi": paper["published"],
+                "preprint_title": paper["title"], "preprint_category": paper["category"],
+                "preprint_date": paper["date"], "published_journal": "Journal", "published_date": paper["date"],
+                "server": paper["server"]}
+
+    def _monthly(self) -> Counter:
+        return Counter(paper["date"][:7] for paper in self.records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the bioRxiv API",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--papers', type=int, default=10000, help="Number of distinct papers in the corpus.")
+    parser.add_argument('--duplicate_rate', type=float, default=0.2, help="Share of papers with a second version.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds waited before each response.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Share of requests answered with a 500.")
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help="Share of requests answered with a 429.")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on.")
+    args = parser.parse_args()
+
+    mock = MockBiorxivServer(papers=args.papers, duplicate_rate=args.duplicate_rate, latency=args.latency,
+                             error_rate=args.error_rate, throttle_rate=args.throttle_rate, port=args.port)
+    print(f"Serving {len(mock.records)} records at {mock.api_url}")
+    mock.serve_forever()
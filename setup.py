@@ -6,4 +6,18 @@ setup(
     install_requires=[
         "requests",
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "parquet": ["pyarrow"],
+        "fast-json": ["orjson", "ijson"],
+        "test": ["pytest"],
+    },
+    entry_points={
+        "console_scripts": [
+            "biorxiv-search = src.cli.search.search:main",
+            "biorxiv-create-data = src.cli.create_data.create_data:main",
+            "biorxiv-export = src.cli.export.export:main",
+            "biorxiv-query = src.cli.query.query:main",
+        ],
+    },
 )
@@ -0,0 +1,205 @@
+import asyncio
+from collections import deque
+from itertools import islice
+import time
+from typing import AsyncIterator, Dict, List
+from urllib.parse import urlsplit
+from src.biorxiv_retriever import API_URL, BASE_URLs, PAGINATED_SERVICES, build_url
+from src.cache import ResponseCache
+from src.decoding import loads
+from src.metrics import get_metrics
+from src.requester import THROTTLING_STATUS, RateLimiter, get_rate_limiter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+RETRY_STATUS = (500, 502, 504) + THROTTLING_STATUS
+NO_RESULTS = "no posts found"
+
+
+class AsyncBiorxivClient:
+    """
+    asyncio client for every service of the [biorxiv API](https://api.biorxiv.org/), the async counterpart of
+    `BiorxivRequester` and `BiorxivRetriever`. Requires the optional dependency `aiohttp`.
+
+    All the requests of a client share one connection pool, are bounded by a semaphore of `concurrency`
+    in-flight requests, retried with exponential backoff and rate limited by the process-wide `RateLimiter`.
+    Paginated services can be consumed as async iterators, fetching the following pages concurrently.
+
+    Usage:
+        ```python
+        async with AsyncBiorxivClient(concurrency=100, email="my.email@email.acme") as client:
+            response = await client.get("details", server="biorxiv", doi="10.1101/2020.09.09.289074")
+            async for paper in client.iter_papers("details", server="medrxiv",
+                                                  start_date="2022-05-01", end_date="2022-05-31"):
+                ...
+        ```
+    """
+    def __init__(self, concurrency: int = 50, email: str = "", timeout: float = 60, retries: int = 4,
+                 backoff_factor: float = 0.3, rate_limiter: RateLimiter = None, cache: ResponseCache = None,
+                 api_url: str = API_URL):
+        """
+        Parameters
+        ----------
+        concurrency : int, optional
+            Maximum number of requests in flight at the same time.
+        email : str, optional
+            Email for identification. It is advisable for polite requests but not mandatory.
+        timeout : float, optional
+            Timeout in seconds of each request.
+        retries : int, optional
+            Number of retries on connection errors and on the statuses in `RETRY_STATUS`.
+        backoff_factor : float, optional
+            The n-th retry waits `backoff_factor * 2 ** (n - 1)` seconds.
+        rate_limiter : RateLimiter, optional
+            Defaults to the limiter shared by the process, from `requester.get_rate_limiter`.
+        cache : ResponseCache, optional
+            Persistent cache of the responses, as for `BiorxivRetriever`.
+        api_url : str, optional
+            Root URL of the API, ending with '/', as for `BiorxivRetriever`.
+        """
+        assert aiohttp is not None, "AsyncBiorxivClient requires aiohttp: pip install aiohttp"
+        self.concurrency = concurrency
+        self.headers = {"Accept": "application/json"}
+        if email:
+            self.headers["From"] = email
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.cache = cache
+        self.api_url = api_url
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency),
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                             headers=self.headers)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, url: str, allow_empty: bool = False, closed: bool = False) -> dict:
+        """Returns the decoded response of `url`.
+        Parameters
+        ----------
+        url : str
+            URL for the API call, see `biorxiv_retriever.build_url`.
+        allow_empty : bool, optional
+            If True, a response reporting that no posts were found is returned with an empty 'collection'
+            instead of failing the status assertion.
+        closed : bool, optional
+            Whether `url` covers a closed date window, whose response is cached without expiry."""
+        if self.cache is not None:
+            response = self.cache.get(url)
+            if response is not None:
+                return response
+        async with self._semaphore:
+            status, body = await self._get(url)
+        assert status == 200, f"""problem with biorxiv api ({status}) with request {url}"""
+        response = loads(body)
+        messages = response['messages']
+        api_status = messages['status'] if isinstance(messages, dict) else messages[0]['status']
+        if allow_empty and api_status == NO_RESULTS:
+            return {**response, 'collection': []}
+        assert api_status == 'ok', f"""⚠️ The API request shows no matching results. {api_status} ⚠️, \n{url}"""
+        if self.cache is not None:
+            self.cache.set(url, response, closed=closed)
+        return response
+
+    async def _get(self, url: str):
+        """Sends the request, retrying connection errors and retryable statuses. Returns the status and body."""
+        bucket = self.rate_limiter.bucket(url)
+        metrics = get_metrics()
+        host = urlsplit(url).hostname
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            wait = bucket.reserve()
+            if wait > 0:
+                metrics.inc("rate_limit_wait_seconds_total", wait, host=host)
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            try:
+                async with self.session.get(url) as response:
+                    if response.status in THROTTLING_STATUS:
+                        bucket.throttled(_retry_after(response.headers.get("Retry-After")))
+                    elif response.status < 400:
+                        bucket.succeeded()
+                    body = await response.read()
+                    metrics.request(host, response.status, time.perf_counter() - start, len(body))
+                    if response.status not in RETRY_STATUS or attempt == self.retries:
+                        return response.status, body
+                    metrics.inc("retries_total", host=host, reason=str(response.status))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    metrics.inc("request_errors_total", host=host, error=type(e).__name__)
+                    raise
+                metrics.inc("retries_total", host=host, reason=type(e).__name__)
+
+    async def get(self, service: str, **params) -> dict:
+        """Returns the response of a single call to `service`. `params` are the ones of `BiorxivRetriever`,
+        e.g. `server`, `start_date`, `end_date`, `cursor`, `doi`, `prefix`, `interval`."""
+        assert service in BASE_URLs.keys(), \
+            f"Please ensure that you are defining service as one of the following values: {BASE_URLs.keys()}"
+        return await self.fetch(build_url(service, api_url=self.api_url, **params),
+                                closed=self._is_closed(service, params))
+
+    async def fetch_many(self, urls: List[str], allow_empty: bool = False) -> List[dict]:
+        """Fetches `urls` concurrently and returns their responses in the same order."""
+        return await asyncio.gather(*(self.fetch(url, allow_empty=allow_empty) for url in urls))
+
+    async def iter_pages(self, service: str, **params) -> AsyncIterator[dict]:
+        """Yields every cursor page of a paginated service ('details', 'pubs', 'pub', 'publisher') in cursor order.
+        Once the first page gives the total, the following pages are fetched concurrently, at most `concurrency`
+        ahead of the page being consumed."""
+        assert service in PAGINATED_SERVICES and not params.get("doi"), \
+            f"Only searches over a date range of {PAGINATED_SERVICES} are paginated"
+        cursor = int(params.pop("cursor", 0))
+        closed = self._is_closed(service, params)
+
+        def url(page_cursor: int) -> str:
+            return build_url(service, cursor=page_cursor, api_url=self.api_url, **params)
+
+        first = await self.fetch(url(cursor), allow_empty=True, closed=closed)
+        yield first
+        total = int(first['messages'][0].get('total', 0))
+        cursors = iter(range(cursor + 100, total, 100))
+        pending = deque(asyncio.ensure_future(self.fetch(url(page_cursor), allow_empty=True, closed=closed))
+                        for page_cursor in islice(cursors, self.concurrency))
+        try:
+            while pending:
+                response = await pending.popleft()
+                for page_cursor in islice(cursors, 1):
+                    pending.append(asyncio.ensure_future(self.fetch(url(page_cursor), allow_empty=True, closed=closed)))
+                yield response
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_papers(self, service: str, **params) -> AsyncIterator[dict]:
+        """Yields the records of every cursor page of a paginated service, see `iter_pages`."""
+        metrics = get_metrics()
+        async for response in self.iter_pages(service, **params):
+            metrics.inc("pages_total")
+            metrics.inc("records_total", len(response['collection']))
+            for paper in response['collection']:
+                yield paper
+
+    @staticmethod
+    def _is_closed(service: str, params: Dict) -> bool:
+        return service in PAGINATED_SERVICES and not params.get("doi") \
+            and ResponseCache.is_closed(params.get("end_date"))
+
+
+def _retry_after(value: str) -> float:
+    """Parses a Retry-After header given in seconds. HTTP dates are ignored."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -1,16 +1,36 @@
 import json
-from urllib import request
 from datetime import datetime
 from os.path import join
 import os
 from os import path
+from typing import Iterable, Iterator
+import requests
+from src.cache import ResponseCache
+from src.constants import API_URL
+from src.date_windows import split_date_range
+from src.decoding import decode_response
+from src.requester import get_session
+from src.utils import ordered_map
 
-BASE_URLs = {"details": "https://api.biorxiv.org/details/",
-             "pubs": "https://api.biorxiv.org/pubs/",
-             "pub": "https://api.biorxiv.org/pub/",
-             "publisher": "https://api.biorxiv.org/publisher/",
-             "sum": "https://api.biorxiv.org/sum/",
-             "usage": "https://api.biorxiv.org/usage/"}
+BASE_URLs = {service: f"{API_URL}{service}/" for service in ["details", "pubs", "pub", "publisher", "sum", "usage"]}
+PAGINATED_SERVICES = ['details', 'pubs', 'pub', 'publisher']
+
+
+def build_url(service: str, server: str = "biorxiv", start_date: str = '2020-01-01', end_date: str = '2022-03-31',
+              interval: str = 'm', cursor: int = 0, format_: str = 'json', prefix: str = '10.15252',
+              doi: str = "", api_url: str = API_URL) -> str:
+    """Returns the URL of a call to the Biorxiv API. The parameters are the ones of `BiorxivRetriever`,
+    only the ones used by `service` are taken into account."""
+    base_url = f"{api_url}{service}/"
+    if service in ['details', 'pubs']:
+        if doi:
+            return f"{base_url}{server}/{doi}/na/{format_}"
+        return f"{base_url}{server}/{start_date}/{end_date}/{cursor}/{format_}"
+    elif service == 'pub':
+        return f"{base_url}{start_date}/{end_date}/{cursor}"
+    elif service == 'publisher':
+        return f"{base_url}{prefix}/{start_date}/{end_date}/{cursor}"
+    return f"{base_url}{interval}/{format_}"
 
 
 class BiorxivRetriever:
@@ -57,14 +77,21 @@ class BiorxivRetriever:
 
     Methods
     -------
-    says(sound=None)
-        Prints the animals name and what sound it makes
+    __call__()
+        Writes the API response to `save_folder/filename`.
+    refresh()
+        Calls the API again. Otherwise the response is fetched once, on first access, and memoized.
+    split(freq='month')
+        Splits a search over a date range into one retriever per monthly or weekly sub-window.
+    iter_pages(prefetch=1), iter_papers(prefetch=1)
+        Lazily walk every cursor page of a paginated search, yielding pages or records.
     """
     def __init__(self, service: str, server: str, start_date: str = '2020-01-01',
                  end_date: str = '2022-03-31', interval: str = 'm', cursor: str = 0,
                  format_: str = 'json', prefix: str = '10.15252', doi: str = "",
                  filename: str = "biorxiv_metadata.json",
-                 save_folder: str = "./data"):
+                 save_folder: str = "./data", session: requests.Session = None, cache: ResponseCache = None,
+                 api_url: str = API_URL):
         """
         Parameters
         ----------
@@ -88,10 +115,21 @@ class BiorxivRetriever:
         format can also be set to 'csv' to generate a .csv file.
     prefix : str, optional
          String of the publisher prefix, eg '10.15252'
+    session : requests.Session, optional
+        Session used for the API calls. Defaults to the shared session from `requester.get_session`.
+    cache : ResponseCache, optional
+        Persistent cache of the API responses, keyed by `url`. Searches over a date range ending before today
+        are served from it without calling the API again.
+    api_url : str, optional
+        Root URL of the API, ending with '/'. Defaults to `API_URL`, it can point to a mirror or a local mock server.
         """
+        self._params = dict(service=service, server=server, start_date=start_date, end_date=end_date,
+                            interval=interval, cursor=cursor, format_=format_, prefix=prefix, doi=doi,
+                            filename=filename, save_folder=save_folder, session=session, cache=cache,
+                            api_url=api_url)
         assert service in BASE_URLs.keys(), \
             f"Please ensure that you are defining service as one of the following values: {BASE_URLs.keys()}"
-        self.base_url = BASE_URLs[service]
+        self.base_url = f"{api_url}{service}/"
         self.start_date = start_date
         self.end_date = end_date
         self.server = server
@@ -103,10 +141,12 @@ class BiorxivRetriever:
         self.prefix = prefix
         self.save_folder = save_folder
         self.filename = filename
+        self.session = session or get_session()
+        self.cache = cache
+        self.url = build_url(service, server, start_date, end_date, interval, cursor, format_, prefix, doi, api_url)
 
         if service in ['details', 'pubs']:
             if doi:
-                self.url = f"{self.base_url}{server}/{doi}/na/{format_}"
                 self.start_date = "NOT APPLICABLE"
                 self.end_date = "NOT APPLICABLE"
                 self.interval = "NOT APPLICABLE"
@@ -114,25 +154,21 @@ class BiorxivRetriever:
                 self.prefix = "NOT APPLICABLE"
             else:
                 assert self._date_assertion(), "start_date must be prior to end_date"
-                self.url = f"{self.base_url}{server}/{start_date}/{end_date}/{cursor}/{format_}"
                 self.doi = "NOT APPLICABLE"
                 self.interval = "NOT APPLICABLE"
                 self.prefix = "NOT APPLICABLE"
         elif service == 'pub':
-            self.url = f"{self.base_url}{start_date}/{end_date}/{cursor}"
             self.interval = "NOT APPLICABLE"
             self.doi = "NOT APPLICABLE"
             self.prefix = "NOT APPLICABLE"
             self.server = "NOT APPLICABLE"
             self.format_ = "NOT APPLICABLE"
         elif service == 'publisher':
-            self.url = f"{self.base_url}{prefix}/{start_date}/{end_date}/{cursor}"
             self.interval = "NOT APPLICABLE"
             self.doi = "NOT APPLICABLE"
             self.server = "NOT APPLICABLE"
             self.format = "NOT APPLICABLE"
         elif service in ['sum', 'usage']:
-            self.url = f"{self.base_url}{interval}/{format_}"
             self.start_date = "NOT APPLICABLE"
             self.end_date = "NOT APPLICABLE"
             self.doi = "NOT APPLICABLE"
@@ -142,38 +178,146 @@ class BiorxivRetriever:
         else:
             raise ValueError(f"Please define service as one of the following values: {BASE_URLs.keys()}")
 
-        self.messages = self._retrieve_metadata()['messages']
-        if self.service not in ["sum", "usage"]:
-            self.papers = self._retrieve_metadata()['collection']
-            self.total_articles = self.messages = self._retrieve_metadata()['messages'][0]['total']
-            self.count = self.messages = self._retrieve_metadata()['messages'][0]['count']
+        self._response = None
+
+    def __call__(self, all_pages: bool = False):
+        """Writes the API response to `save_folder/filename`.
+        Parameters
+        ----------
+        all_pages : bool, optional
+            If True, walks every cursor page of a paginated search and streams the records to the file as
+            JSON Lines, one record per line, instead of writing the single page at `cursor`."""
+        if all_pages:
+            self._write_jsonl(self.iter_papers())
+        else:
+            self._write_file(self.response)
+
+    def iter_pages(self, prefetch: int = 1) -> Iterator[dict]:
+        """Lazily yields the API response of every cursor page of a paginated search, starting at `cursor`.
+        Works for 'details' and 'pubs' without doi, 'pub' and 'publisher'.
+        Parameters
+        ----------
+        prefetch : int, optional
+            Number of pages fetched in the background ahead of the page being consumed. 0 fetches each page
+            only when it is requested."""
+        assert self.service in PAGINATED_SERVICES and not self._params['doi'], \
+            f"Only searches over a date range of {PAGINATED_SERVICES} are paginated"
+        yield self.response
+        total = int(self.messages[0].get('total', 0))
+        cursors = range(int(self._params['cursor']) + 100, total, 100)
+        if prefetch:
+            yield from ordered_map(self._retrieve_page, cursors, prefetch)
         else:
-            self.papers = self._retrieve_metadata()['bioRxiv content statistics']
-            self.total_articles = None
+            yield from map(self._retrieve_page, cursors)
+
+    def iter_papers(self, prefetch: int = 1) -> Iterator[dict]:
+        """Lazily yields the records of every cursor page of a paginated search, one at a time, so arbitrarily
+        large results can be consumed in constant memory. See `iter_pages`."""
+        for response in self.iter_pages(prefetch=prefetch):
+            yield from response['collection']
+
+    @property
+    def response(self) -> dict:
+        """API response for `self.url`. It is fetched on first access and memoized, so the API is called
+        only once per instance. Use `refresh` to fetch it again."""
+        if self._response is None:
+            self._response = self._retrieve_metadata()
+        return self._response
+
+    def refresh(self) -> dict:
+        """Discards the memoized response and calls the API again.
+        :returns dict with the new API response."""
+        self._response = None
+        return self.response
+
+    @property
+    def messages(self):
+        return self.response['messages']
+
+    @property
+    def papers(self) -> list:
+        if self.service in ["sum", "usage"]:
+            return self.response['bioRxiv content statistics']
+        return self.response['collection']
+
+    @property
+    def total_articles(self):
+        if self.service in ["sum", "usage"]:
+            return None
+        return self.messages[0]['total']
 
-    def __call__(self):
-        metadata = self._retrieve_metadata()
-        self._write_file(metadata)
+    @property
+    def count(self):
+        if self.service in ["sum", "usage"]:
+            return None
+        return self.messages[0]['count']
+
+    def split(self, freq: str = "month") -> list:
+        """Splits the date range of the search into monthly or weekly sub-windows.
+        Only for the services paginated over a date range: 'details' and 'pubs' without doi, 'pub' and 'publisher'.
+        Parameters
+        ----------
+        freq : str, optional
+            'month' or 'week'.
+        :returns `list` of `BiorxivRetriever`, one per sub-window, starting at cursor 0. Their output filenames
+                are suffixed with the window start date."""
+        assert self.service in ['details', 'pubs', 'pub', 'publisher'] and not self._params['doi'], \
+            "Only searches over a date range can be split"
+        name, extension = os.path.splitext(self.filename)
+        retrievers = []
+        for start_date, end_date in split_date_range(self.start_date, self.end_date, freq):
+            params = {**self._params, "start_date": start_date, "end_date": end_date, "cursor": 0,
+                      "filename": f"{name}_{start_date}{extension}"}
+            retrievers.append(BiorxivRetriever(**params))
+        return retrievers
 
-    def _retrieve_metadata(self):
-        """Returns the metadata from the Biorxiv API.
+    def _retrieve_metadata(self, url: str = None):
+        """Returns the metadata from the Biorxiv API for `url`, by default `self.url`.
         :returns dict with the API response. The API will have 'messages' and 'collections' as keys.
                 'messages' contains information of the http request. 'collections' is a `list`
                 containing the metadata, stored as `dict` objects."""
-        response = json.loads(request.urlopen(self.url).read().decode("utf-8"))
+        url = url or self.url
+        if self.cache is not None:
+            response = self.cache.get(url)
+            if response is not None:
+                return response
+        response = self.session.get(url)
+        assert response.status_code == 200, f"""problem with biorxiv api ({response.status_code}) with request {url}"""
+        response = decode_response(response)
         if self.service in ["sum", "usage"]:
             assert response['messages'][
                        'status'] == "ok", f"⚠️ URL is not correct. Do you have the correct interval 'm' or 'y'?"
         else:
             assert response['messages'][0][
-                       'status'] == 'ok', f"⚠️ Do you use the correct server biorxiv or medrxiv? {response['messages'][0]['status']} ⚠️, \n{self.url}"
+                       'status'] == 'ok', f"⚠️ Do you use the correct server biorxiv or medrxiv? {response['messages'][0]['status']} ⚠️, \n{url}"
+        if self.cache is not None:
+            self.cache.set(url, response, closed=self._is_closed())
         return response
 
+    def _retrieve_page(self, cursor: int) -> dict:
+        """Returns the API response for the page at `cursor` of the same search."""
+        params = {key: self._params[key] for key in ['server', 'start_date', 'end_date', 'interval', 'format_',
+                                                     'prefix', 'doi', 'api_url']}
+        return self._retrieve_metadata(build_url(self.service, cursor=cursor, **params))
+
+    def _is_closed(self) -> bool:
+        """Whether the response can no longer change: a search over a date range ending before today."""
+        return self.service in ['details', 'pubs', 'pub', 'publisher'] and ResponseCache.is_closed(self.end_date)
+
     def _date_assertion(self):
         start = datetime.strptime(self.start_date, '%Y-%m-%d')
         end = datetime.strptime(self.end_date, '%Y-%m-%d')
         return start < end
 
+    def _write_jsonl(self, papers: Iterable[dict]) -> None:
+        """Streams `papers` into a JSON Lines file in the self.data_folder provided at class instantiation."""
+        if not path.exists(self.save_folder):
+            os.makedirs(self.save_folder)
+
+        with open(join(self.save_folder, self.filename), "w") as fp:
+            for paper in papers:
+                fp.write(json.dumps(paper) + "\n")
+
     def _write_file(self, data: dict) -> None:
         """Writes data into a json file in the self.data_folder provided at class instantiation."""
         if not path.exists(self.save_folder):
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+from os import path
+from os.path import join
+from typing import Iterable, List, Tuple
+import requests
+from src.biorxiv_retriever import API_URL, BiorxivRetriever
+from src.cache import ResponseCache
+from src.requester import get_session
+from src.utils import ordered_map
+
+DOI_PREFIXES = ["https://doi.org/", "http://doi.org/", "doi:"]
+
+
+class BulkDoiLookup:
+    """
+    Resolves many DOIs with the 'details' or 'pubs' service of the Biorxiv API.
+    The lookups run concurrently over the shared session, and an optional response cache. The records found
+    are streamed to a JSON Lines file as they are resolved, in the order of the input DOIs. DOIs that cannot
+    be resolved are written to a separate file with the reason, instead of stopping the run.
+
+    Usage:
+        ```python
+        lookup = BulkDoiLookup(read_dois("dois.txt"), server="biorxiv", workers=16)
+        found, failed = lookup()
+        ```
+    """
+    def __init__(self, dois: Iterable[str], server: str = "biorxiv", service: str = "details", workers: int = 8,
+                 save_folder: str = "./data", filename: str = "biorxiv-dois.jsonl",
+                 session: requests.Session = None, cache: ResponseCache = None,
+                 api_url: str = API_URL):
+        """
+        Parameters
+        ----------
+        dois : iterable of str
+            DOIs to look up.
+        server : str, optional
+            'biorxiv' or 'medrxiv'.
+        service : str, optional
+            'details' or 'pubs'.
+        workers : int, optional
+            Number of DOIs resolved concurrently.
+        save_folder : str, optional
+            Folder to write the output data.
+        filename : str, optional
+            Name of the JSON Lines file with the records found. The DOIs that failed are written to
+            `<filename>.failed.tsv`.
+        session : requests.Session, optional
+            Defaults to the shared session from `requester.get_session`.
+        cache : ResponseCache, optional
+            Persistent cache of the API responses.
+        api_url : str, optional
+            Root URL of the API, ending with '/', as for `BiorxivRetriever`.
+        """
+        assert service in ["details", "pubs"], "Only the 'details' and 'pubs' services can look up DOIs"
+        self.dois = [normalize_doi(doi) for doi in dois if doi.strip()]
+        self.server = server
+        self.service = service
+        self.workers = max(1, int(workers))
+        self.save_folder = save_folder
+        self.filename = filename
+        self.session = session or get_session(pool_size=self.workers)
+        self.cache = cache
+        self.api_url = api_url
+        self.failed: List[Tuple[str, str]] = []
+
+    def __call__(self) -> Tuple[int, int]:
+        """Looks up every DOI and writes the records found and the failed DOIs.
+        :returns the number of DOIs found and the number of DOIs that failed."""
+        if not path.exists(self.save_folder):
+            os.makedirs(self.save_folder)
+        self.failed = []
+        found = 0
+        with open(join(self.save_folder, self.filename), "w") as fp:
+            for count_, (doi, papers, error) in enumerate(ordered_map(self.lookup, self.dois, self.workers)):
+                print(f"""Looking up DOI {count_} from a total of {len(self.dois)}. Progress of {round(100 * count_ / len(self.dois), 2)}%""", end='\r')
+                if error:
+                    self.failed.append((doi, error))
+                    continue
+                found += 1
+                for paper in papers:
+                    fp.write(json.dumps(paper) + "\n")
+        with open(join(self.save_folder, f"{self.filename}.failed.tsv"), "w") as fp:
+            for doi, error in self.failed:
+                fp.write(f"{doi}\t{error}\n")
+        return found, len(self.failed)
+
+    def lookup(self, doi: str) -> Tuple[str, list, str]:
+        """Looks up a single DOI.
+        :returns the DOI, the records found and an error message, empty if the lookup succeeded."""
+        retriever = BiorxivRetriever(self.service, self.server, doi=doi, session=self.session, cache=self.cache,
+                                     api_url=self.api_url)
+        try:
+            return doi, retriever.papers, ""
+        except (AssertionError, requests.exceptions.RequestException, ValueError) as e:
+            message = " ".join(str(e).split())
+            logging.warning(f"{doi} could not be looked up: {message}")
+            return doi, [], f"{type(e).__name__}: {message}"
+
+
+def normalize_doi(doi: str) -> str:
+    """Strips whitespace and URL or 'doi:' prefixes from a DOI."""
+    doi = doi.strip()
+    for prefix in DOI_PREFIXES:
+        if doi.lower().startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
+
+def read_dois(filename: str) -> List[str]:
+    """Reads a file with one DOI per line. Empty lines and lines starting with '#' are skipped."""
+    with open(filename) as fp:
+        return [line.strip() for line in fp if line.strip() and not line.startswith("#")]
@@ -0,0 +1,135 @@
+from datetime import date
+import os
+from os import path
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from src.decoding import dumps, loads
+
+
+class ResponseCache:
+    """
+    Persistent cache of API responses, stored in a SQLite file and keyed by the fully built request URL.
+
+    Responses of closed date windows, ending before today, never change and are kept until evicted. Responses
+    of windows still open, or of services without a date window, expire after `open_ttl` seconds. When the
+    stored responses exceed `max_size` bytes, the least recently used ones are evicted.
+
+    Usage:
+        ```python
+        cache = ResponseCache("./data/biorxiv_cache.sqlite")
+        response = cache.get(url)
+        if response is None:
+            response = requester()
+            cache.set(url, response, closed=ResponseCache.is_closed("2022-03-31"))
+        print(cache.stats)
+        ```
+    """
+    def __init__(self, filename: str = "./data/biorxiv_cache.sqlite", max_size: int = 1024 ** 3,
+                 open_ttl: float = 3600, closed_ttl: float = None):
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            Path of the SQLite file. The parent folder is created if needed.
+        max_size : int, optional
+            Maximum size in bytes of the stored responses. Defaults to 1 GiB.
+        open_ttl : float, optional
+            Time to live in seconds of responses for open windows. Defaults to one hour.
+        closed_ttl : float, optional
+            Time to live in seconds of responses for closed windows. Defaults to None, never expiring.
+        """
+        folder = path.dirname(filename)
+        if folder and not path.exists(folder):
+            os.makedirs(folder)
+        self.filename = filename
+        self.max_size = max_size
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                url TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL,
+                                expires REAL, last_access REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def is_closed(end_date: str) -> bool:
+        """Whether a date window ending at `end_date` (YYYY-MM-DD) is over, so its results cannot change."""
+        try:
+            return date.fromisoformat(end_date) < date.today()
+        except (TypeError, ValueError):
+            return False
+
+    def get(self, url: str) -> Optional[dict]:
+        """Returns the cached response for `url`, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, expires FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                if row is not None:
+                    self._delete(url)
+                    self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+            self._db.commit()
+            self.hits += 1
+        return loads(row[0])
+
+    def set(self, url: str, response: dict, closed: bool = False) -> None:
+        """Stores `response` for `url`, then evicts the least recently used responses above `max_size`.
+        Parameters
+        ----------
+        url : str
+            Request URL.
+        response : dict
+            Decoded API response.
+        closed : bool, optional
+            Whether the response belongs to a closed date window, see `is_closed`.
+        """
+        body = dumps(response)
+        ttl = self.closed_ttl if closed else self.open_ttl
+        now = time.time()
+        with self._lock:
+            self._delete(url)
+            self._db.execute("INSERT INTO responses (url, body, size, expires, last_access) VALUES (?, ?, ?, ?, ?)",
+                             (url, body, len(body), None if ttl is None else now + ttl, now))
+            self._size += len(body)
+            while self._size > self.max_size:
+                oldest = self._db.execute("SELECT url FROM responses ORDER BY last_access LIMIT 1").fetchone()
+                if oldest is None:
+                    break
+                self._delete(oldest[0])
+                self.evictions += 1
+            self._db.commit()
+
+    def _delete(self, url: str) -> None:
+        row = self._db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._size -= row[0]
+
+    def clear(self) -> None:
+        """Removes every cached response."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._size = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hits, misses and evictions since the cache was opened, with the current number and size of responses."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": entries, "size": self._size}
+
+    def close(self) -> None:
+        self._db.close()
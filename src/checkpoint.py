@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+from os import path
+from typing import Dict, List
+
+
+class Checkpoint:
+    """
+    Keeps track of the cursor pages already processed by a crawl, so an interrupted crawl can resume
+    where it stopped. The state is stored as a small json file next to the output and rewritten atomically
+    after every page.
+
+    Pages are grouped by date window, identified as 'start_date/end_date'. A checkpoint is only resumed
+    if it was written with the same crawl parameters.
+
+    Usage:
+        ```python
+        checkpoint = Checkpoint("./data/biorxiv.json.checkpoint", params)
+        cursor = checkpoint.next_cursor("2011-01-01/2022-05-01")
+        ...
+        checkpoint.mark("2011-01-01/2022-05-01", cursor, total)
+        ```
+    """
+    def __init__(self, filename: str, params: dict):
+        """
+        Parameters
+        ----------
+        filename : str
+            Path of the checkpoint file.
+        params : dict
+            Parameters defining the crawl. A checkpoint on disk written with other parameters is ignored.
+        """
+        self.filename = filename
+        self.params = params
+        self.completed: Dict[str, List[int]] = {}
+        self.totals: Dict[str, int] = {}
+        self.resumed = False
+        if path.exists(filename):
+            with open(filename) as fp:
+                state = json.load(fp)
+            if state.get("params") == params:
+                self.completed = state["completed"]
+                self.totals = state["totals"]
+                self.resumed = True
+            else:
+                logging.warning(f"Checkpoint {filename} was written with different parameters and is ignored")
+
+    def next_cursor(self, window: str) -> int:
+        """Returns the first cursor of `window` that has not been completed."""
+        done = set(self.completed.get(window, []))
+        cursor = 0
+        while cursor in done:
+            cursor += 100
+        return cursor
+
+    def mark(self, window: str, cursor: int, total: int) -> None:
+        """Records the page at `cursor` of `window` as completed and saves the checkpoint."""
+        self.completed.setdefault(window, []).append(cursor)
+        self.totals[window] = total
+        self.save()
+
+    def save(self) -> None:
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "w") as fp:
+            json.dump({"params": self.params, "completed": self.completed, "totals": self.totals}, fp)
+        os.replace(tmp_filename, self.filename)
+
+    def remove(self) -> None:
+        if path.exists(self.filename):
+            os.remove(self.filename)
@@ -1,36 +1,106 @@
-from ...dataset_generator import BiorxivDataGenerator
+from ...constants import API_URL, SERVERS
 import argparse
 from datetime import date
+from typing import List
 
-if __name__ == "__main__":
+
+def main(argv: List[str] = None) -> None:
     parser = argparse.ArgumentParser(description="Retrieves bioRxiv preprint results and generates a dataset file",
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
-    parser.add_argument('server', nargs="?", default="biorxiv", help="""Server to retrieve data from. 'biorxiv' or 
-                                                                        'medrxiv'. To be use for the services
-                                                                        ['details', 'pubs']""")
+    parser.add_argument('server', nargs="*", default="biorxiv", choices=SERVERS,
+                        help="""Servers to retrieve data from, 'biorxiv', 'medrxiv' or both. Several servers are
+                                crawled concurrently into a single dataset.""")
     parser.add_argument('--start_date', default='2011-01-01', help="Start date for the search (format YYYY-MM-DD)")
     parser.add_argument('--end_date', default=str(date.today()), help="End date for the search (format YYYY-MM-DD)")
     parser.add_argument('--save_folder', nargs="?", default="../data", help="""Name API fields to retrieve. Comma separated.
                                                                     Only valid for 'task'='create_dataset'.""")
     parser.add_argument('--email', nargs="?", default="",
                         help="""Email for identification. It is advisable but not mandatory.""")
-    parser.add_argument('--filename', nargs="?", default="biorxiv-dataset.json",
-                        help="""Name of the file with the data output.""")
+    parser.add_argument('--filename', nargs="?", default=None,
+                        help="""Name of the file with the data output. Defaults to biorxiv-dataset.json, or
+                                biorxiv-dataset.jsonl with --output_format=jsonl.""")
     parser.add_argument('--xml', nargs="?", default="False",
                         help="""If True, it will add the XML files containing the full text of the articles to the dataset.""")
+    parser.add_argument('--xml_workers', type=int, default=4,
+                        help="""Number of XML files downloaded concurrently.""")
+    parser.add_argument('--xml_storage', default="files", choices=["files", "shards"],
+                        help="""'files' writes one XML file per paper, 'shards' packs them into compressed
+                                monthly shards with an index by DOI.""")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="""Number of cursor pages fetched concurrently.""")
+    parser.add_argument('--output_format', default="json", choices=["json", "jsonl"],
+                        help="""'jsonl' streams the records to a JSON Lines file as they are downloaded.""")
+    parser.add_argument('--checkpoint', action="store_true",
+                        help="""Saves the progress after every page and resumes an interrupted crawl
+                                run with the same parameters.""")
+    parser.add_argument('--sync', action="store_true",
+                        help="""Updates an existing output file with the papers posted since its latest date
+                                instead of crawling from start_date.""")
+    parser.add_argument('--shard', default=None, choices=["month", "week"],
+                        help="""Splits the date range into monthly or weekly windows crawled independently.""")
+    parser.add_argument('--shard_workers', type=int, default=1,
+                        help="""Number of windows crawled concurrently when --shard is set.""")
+    parser.add_argument('--dedup', default="latest", choices=["latest", "first", "all"],
+                        help="""Keeps the latest version of each paper, the first one seen, or all versions.""")
+    parser.add_argument('--pool_size', type=int, default=None,
+                        help="""Number of HTTP connections kept alive. Defaults to the number of workers.""")
+
+    parser.add_argument('--rate_limit', type=float, default=10,
+                        help="""Maximum number of requests per second to each host. Lowered automatically
+                                when the server throttles the crawl.""")
+    parser.add_argument('--burst', type=int, default=10,
+                        help="""Number of requests that can be sent at once after a quiet period.""")
+    parser.add_argument('--cache', nargs="?", default="",
+                        help="""SQLite file caching the API responses. Responses for date windows ending
+                                before today are reused without calling the API again.""")
+    parser.add_argument('--metrics', nargs="?", default="",
+                        help="""File where the crawl metrics are written while it runs and at its end. Prometheus
+                                text format if it ends with '.prom', JSON otherwise.""")
+    parser.add_argument('--metrics_interval', type=float, default=15,
+                        help="""Seconds between two writes of the --metrics file.""")
+    parser.add_argument('--api_url', nargs="?", default=API_URL,
+                        help="""Root URL of the API, e.g. a local mock server for benchmarks.""")
+
+    args = parser.parse_args(argv)
+    from ...cache import ResponseCache
+    from ...dataset_generator import BiorxivDataGenerator
+    from ...metrics import get_metrics
+    from ...requester import configure_rate_limiter
 
-    args = parser.parse_args()
     server = args.server
     start_date = args.start_date
     end_date = args.end_date
     save_folder = args.save_folder
     email = args.email
     xml = args.xml
-    filename = args.filename
+    filename = args.filename or f"biorxiv-dataset.{args.output_format}"
+    workers = args.workers
+    pool_size = args.pool_size
+    output_format = args.output_format
+    checkpoint = args.checkpoint
+    sync = args.sync
+    shard = args.shard
+    shard_workers = args.shard_workers
+    dedup = args.dedup
+    xml_workers = args.xml_workers
+    cache = ResponseCache(args.cache) if args.cache else None
+    configure_rate_limiter(rate=args.rate_limit, burst=args.burst)
+    if args.metrics:
+        metrics = get_metrics()
+        metrics.add_hook(lambda snapshot: metrics.dump(args.metrics), interval=args.metrics_interval)
 
     output = BiorxivDataGenerator(server=server, start_date=start_date, end_date=end_date,
-                                  save_folder=save_folder, email=email, xml=xml, filename=filename)
+                                  save_folder=save_folder, email=email, xml=xml, filename=filename,
+                                  workers=workers, pool_size=pool_size,
+                                  output_format=output_format, checkpoint=checkpoint,
+                                  sync=sync, shard=shard, shard_workers=shard_workers,
+                                  dedup=dedup, xml_workers=xml_workers, xml_storage=args.xml_storage, cache=cache,
+                                  api_url=args.api_url)
 
     output()
     print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import argparse
+from typing import List
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Exports a dataset of paper records to partitioned Parquet or Arrow files",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('input', help="""Output file of create_data or search: JSON Lines, or a JSON object
+                                        keyed by DOI.""")
+    parser.add_argument('--save_folder', nargs="?", default="../data/biorxiv-parquet",
+                        help="""Root folder of the dataset, partitioned as server=<server>/month=<YYYY-MM>.""")
+    parser.add_argument('--format', default="parquet", choices=["parquet", "arrow"],
+                        help="""'parquet' or 'arrow' (Arrow IPC files, read memory-mapped).""")
+    parser.add_argument('--server', nargs="?", default="biorxiv",
+                        help="""Server of the records that do not report one.""")
+    parser.add_argument('--batch_size', type=int, default=50000,
+                        help="""Number of records converted at once.""")
+
+    args = parser.parse_args(argv)
+    from ...export import ColumnarExporter
+    from ...writers import read_records
+
+
+    exporter = ColumnarExporter(args.save_folder, format_=args.format, server=args.server,
+                                batch_size=args.batch_size)
+    exported = exporter(read_records(args.input))
+    print(f"{exported} records exported to {args.save_folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import time
+from typing import List
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Builds and searches a local index of the crawled papers",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--index', nargs="?", default="../data/biorxiv-index.sqlite",
+                        help="""SQLite file of the index.""")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser('build', help="""Indexes the records of a dataset file. Running it again
+                                                   with newer files adds the new papers and versions.""",
+                                  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    build.add_argument('input', nargs="+", help="""Output files of create_data or search: JSON Lines, or JSON
+                                                   objects keyed by DOI.""")
+
+    search = subparsers.add_parser('search', help="""Searches the index offline.""",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    search.add_argument('text', nargs="?", default="",
+                        help="""Full-text query over title, abstract and authors, e.g. 'crispr AND "gene drive"'.""")
+    search.add_argument('--author', nargs="?", default="", help="Words that must appear in the authors.")
+    search.add_argument('--category', nargs="?", default="", help="Category of the papers, e.g. 'neuroscience'.")
+    search.add_argument('--start_date', nargs="?", default="", help="Earliest posting date (format YYYY-MM-DD)")
+    search.add_argument('--end_date', nargs="?", default="", help="Latest posting date (format YYYY-MM-DD)")
+    search.add_argument('--doi_prefix', nargs="?", default="", help="Beginning of the DOI, e.g. '10.1101/2022.05'.")
+    search.add_argument('--server', nargs="?", default="", help="'biorxiv' or 'medrxiv'.")
+    search.add_argument('--limit', type=int, default=20, help="Maximum number of papers returned.")
+    search.add_argument('--json', action="store_true", help="Prints the full records as JSON Lines.")
+
+    args = parser.parse_args(argv)
+    import json
+    import sqlite3
+    from ...local_index import LocalIndex
+    from ...writers import read_records
+
+    index = LocalIndex(args.index)
+
+    if args.command == "build":
+        for filename in args.input:
+            count_ = index.add(read_records(filename))
+            print(f"{count_} records of {filename} indexed")
+        print(f"{len(index)} papers in {args.index}")
+    else:
+        start = time.perf_counter()
+        try:
+            papers = index.search(args.text, author=args.author, category=args.category,
+                                  start_date=args.start_date, end_date=args.end_date, doi_prefix=args.doi_prefix,
+                                  server=args.server, limit=args.limit)
+        except sqlite3.OperationalError as e:
+            index.close()
+            search.error(f"invalid full-text query {args.text!r} ({e})")
+        elapsed = 1000 * (time.perf_counter() - start)
+        for paper in papers:
+            if args.json:
+                print(json.dumps(paper))
+            else:
+                print(f"{paper.get('date')}  {paper['doi']}v{paper['version']}  [{paper.get('category')}]  {paper.get('title')}")
+        if not args.json:
+            print(f"{len(papers)} papers found in {elapsed:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
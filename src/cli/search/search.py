@@ -1,8 +1,10 @@
-from ...biorxiv_retriever import BiorxivRetriever
+from ...constants import API_URL
 import argparse
 from datetime import date
+from typing import List
 
-if __name__ == "__main__":
+
+def main(argv: List[str] = None) -> None:
 
     parser = argparse.ArgumentParser(description="Retrieves metadata of Biorxi API",
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -44,10 +46,30 @@ if __name__ == "__main__":
                                                                     contains more than 100 entries.""")
     parser.add_argument('--save_folder', nargs="?", default="../data", help="""Name API fields to retrieve. Comma separated.
                                                                     Only valid for 'task'='create_dataset'.""")
-    parser.add_argument('--filename', nargs="?", default="biorxiv-metadata.json",
-                        help="""Name of the file with the data output.""")
+    parser.add_argument('--filename', nargs="?", default=None,
+                        help="""Name of the file with the data output. Defaults to biorxiv-metadata.json, or
+                                biorxiv-metadata.jsonl with --all_pages or --doi_file, which write JSON Lines.""")
+
+    parser.add_argument('--all_pages', action="store_true",
+                        help="""Walks every cursor page of the search and streams all the records to the output
+                                file as JSON Lines. For ['details', 'pubs', 'pub', 'publisher'].""")
+    parser.add_argument('--doi_file', nargs="?", default="",
+                        help="""File with one DOI per line. The DOIs are looked up concurrently with the
+                                'details' or 'pubs' service, the records are streamed to the output file as
+                                JSON Lines and the DOIs that failed are written to <filename>.failed.tsv.""")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="""Number of DOIs looked up concurrently with --doi_file.""")
+    parser.add_argument('--cache', nargs="?", default="",
+                        help="""SQLite file caching the API responses. Responses for date windows ending
+                                before today are reused without calling the API again.""")
+    parser.add_argument('--api_url', nargs="?", default=API_URL,
+                        help="""Root URL of the API, e.g. a local mock server for benchmarks.""")
+
+    args = parser.parse_args(argv)
+    from ...biorxiv_retriever import BiorxivRetriever
+    from ...bulk_lookup import BulkDoiLookup, read_dois
+    from ...cache import ResponseCache
 
-    args = parser.parse_args()
     service = args.service
     server = args.server
     start_date = args.start_date
@@ -58,11 +80,22 @@ if __name__ == "__main__":
     interval = args.interval
     cursor = args.cursor
     save_folder = args.save_folder
-    filename = args.filename
+    filename = args.filename or f"biorxiv-metadata.{'jsonl' if args.all_pages or args.doi_file else 'json'}"
+    cache = ResponseCache(args.cache) if args.cache else None
 
-    output = BiorxivRetriever(service, server, start_date=start_date, end_date=end_date,
-                  format_=format_, cursor=cursor, doi=doi, prefix=prefix, interval=interval,
-                            save_folder=save_folder, filename=filename)
+    if args.doi_file:
+        lookup = BulkDoiLookup(read_dois(args.doi_file), server=server, service=service, workers=args.workers,
+                               save_folder=save_folder, filename=filename, cache=cache, api_url=args.api_url)
+        found, failed = lookup()
+        print(f"\n{found} DOIs found, {failed} failed. The records are in {save_folder}/{filename}")
+    else:
+        output = BiorxivRetriever(service, server, start_date=start_date, end_date=end_date,
+                      format_=format_, cursor=cursor, doi=doi, prefix=prefix, interval=interval,
+                                save_folder=save_folder, filename=filename, cache=cache, api_url=args.api_url)
 
-    print(output)
-    output()
+        print(output)
+        output(all_pages=args.all_pages)
+
+
+if __name__ == "__main__":
+    main()
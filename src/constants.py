@@ -0,0 +1,3 @@
+# Kept free of third-party imports, so the CLIs can build their argument parsers without importing requests.
+API_URL = "https://api.biorxiv.org/"
+SERVERS = ["biorxiv", "medrxiv"]
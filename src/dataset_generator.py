@@ -1,19 +1,28 @@
-from datetime import date
+from collections import Counter
+from datetime import date, timedelta
 import json
 from os.path import join
 import os
 from os import path
-from src.requester import BiorxivRequester
-import requests
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from src.constants import API_URL, SERVERS
+from src.requester import BiorxivRequester, get_session
+from src.utils import merge_iterators, ordered_map
+from src.cache import ResponseCache
+from src.checkpoint import Checkpoint
+from src.date_windows import FREQUENCIES, split_date_range
+from src.dedup import POLICIES, Deduplicator
+from src.metrics import get_metrics
+from src.writers import JsonlWriter, read_jsonl, read_records
+from src.xml_downloader import XmlDownloader
+from src.xml_storage import STORAGES
 import logging
-BASE_URL = "https://api.biorxiv.org/details/"
-SOURCE_URL_BASE = 'https://www.biorxiv.org/'
 
 
 class BiorxivDataGenerator:
     """
     Generates a dataset using the biorxiv API and its service details.
-    It can get the data from medrxiv, biorxiv or both separately.
+    It can get the data from medrxiv, biorxiv or both in the same run.
     By default, it will use only biorxiv and generate all the available data since 2011.
 
     It stores the data in a json file that can be further processed to obtained the desired data
@@ -26,17 +35,49 @@ class BiorxivDataGenerator:
         datagen = DatasetGenerator()
         dataset = datagen()
         ```
+    Pages can be fetched concurrently by setting `workers`. Once the first page reports the total number
+    of articles, the remaining cursor pages are requested in parallel and merged back in cursor order,
+    so the output is the same as the one of a serial run.
+        ```python
+        datagen = DatasetGenerator(workers=8)
+        dataset = datagen()
+        ```
+    With `output_format='jsonl'` the records of each page are appended to a JSON Lines file as they arrive
+    instead of being kept in memory until the end of the crawl.
+    With `checkpoint=True` the progress is saved after every page, and a crawl interrupted and restarted
+    with the same parameters resumes where it stopped.
+    With `shard='month'` or `shard='week'` the date range is split into sub-windows crawled independently,
+    `shard_workers` of them at a time, and merged with the same deduplication.
+    With `sync=True` an existing output is updated instead of rebuilt: only the window since the latest
+    posting date found in it is fetched, and merged keeping the latest version of each paper.
+        ```python
+        datagen = DatasetGenerator(filename="biorxiv.json", sync=True)
+        dataset = datagen()
+        ```
+    With `server=['biorxiv', 'medrxiv']` both servers are crawled concurrently, each in its own thread,
+    through the same session pool and rate limiter, and merged into a single dataset.
+        ```python
+        datagen = DatasetGenerator(server=["biorxiv", "medrxiv"], filename="preprints.json", workers=4)
+        dataset = datagen()
+        ```
 
     """
-    def __init__(self, server: str = "biorxiv",
+    def __init__(self, server: Union[str, List[str]] = "biorxiv",
                  start_date: str = '2011-01-01', end_date: str = str(date.today()),
-                 save_folder: str = "./data", filename: str = "biorxiv_data_generator.json", email: str = "",
-                 xml: bool = False):
+                 save_folder: str = "./data", filename: str = None, email: str = "",
+                 xml: bool = False, workers: int = 1, pool_size: int = None, output_format: str = "json",
+                 checkpoint: bool = False, sync: bool = False, shard: str = None, shard_workers: int = 1,
+                 dedup: str = "latest", xml_workers: int = 4, xml_queue_size: int = 1000,
+                 cache: ResponseCache = None, api_url: str = API_URL, stream_pages: bool = False,
+                 xml_storage: str = "files"):
         """
         Parameters
         ----------
-        server : str
-            Server to look for the preprints. 'biorxiv' or 'medrxiv'.
+        server : str or list of str
+            Server to look for the preprints. 'biorxiv', 'medrxiv', or several of them as a list or comma
+            separated, e.g. 'biorxiv,medrxiv'. Several servers are crawled concurrently and merged into one
+            dataset keyed by DOI, the 'server' field of each record telling where it was posted. bioRxiv and
+            medRxiv DOIs never collide.
         start_date : str, optional
             YYYY-MM-DD format. Must be prior to end_date. Defaults to '2011-01-01' to get all existing biorxiv data.
         end_date : str, optional
@@ -44,20 +85,103 @@ class BiorxivDataGenerator:
         save_folder : str, optional
             Folder to write the output data.
         filename : str, optional
-            Name of file containing the json output.
+            Name of file containing the output. Defaults to 'biorxiv_data_generator.json', or
+            'biorxiv_data_generator.jsonl' with `output_format='jsonl'`. A warning is logged if its extension does
+            not match `output_format`, since `writers.read_records` and the CLIs reading the output expect it to.
         email : str, optional
             Email for identification. It is advisable for polite requests but not mandatory.
+        xml : bool, optional
+            If True, it will also download the source XML of the papers.
+        workers : int, optional
+            Number of cursor pages fetched concurrently. Defaults to 1, fetching pages one at a time.
+        pool_size : int, optional
+            Number of connections kept alive in the shared session pool. Defaults to the number of threads
+            of the crawl, `workers * shard_workers` per server plus `xml_workers` if `xml`, and to at least
+            `requester.DEFAULT_POOL_SIZE`.
+        output_format : str, optional
+            'json' writes a single json object keyed by DOI at the end of the crawl. 'jsonl' streams the records
+            to a JSON Lines file page by page, keeping only a DOI index in memory. Newer versions found later in
+            the crawl are appended, and superseded lines are removed once the crawl is complete.
+        checkpoint : bool, optional
+            If True, the completed cursor pages are recorded in `<filename>.checkpoint` next to the output, and
+            for 'json' the records received so far in `<filename>.partial.jsonl`. If these files exist from an
+            interrupted crawl with the same parameters, the crawl resumes from them. They are removed once the
+            crawl is complete. With `xml`, the papers already received are queued again on resume, so the XML
+            downloads interrupted with the crawl are completed.
+        sync : bool, optional
+            If True and the output file already exists, `start_date` is replaced by the latest posting date in it,
+            per server when crawling several, and the new records are merged into it using the deduplication
+            policy.
+            The latest date is fetched again, so papers posted later on that day are not missed.
+        shard : str, optional
+            'month' or 'week'. Splits the date range into sub-windows crawled independently, each with its own,
+            shorter, cursor. Defaults to None, crawling the whole range as a single window.
+        shard_workers : int, optional
+            Number of sub-windows crawled concurrently when `shard` is set. Each of them uses `workers` threads.
+        dedup : str, optional
+            Deduplication policy. 'latest' keeps the latest version of each DOI, 'first' the first version seen
+            and 'all' every version, keyed as '<doi>v<version>'. See `dedup.Deduplicator`.
+        xml_workers : int, optional
+            Number of XML files downloaded concurrently when `xml` is True. The downloads run in their own threads,
+            fed through a queue by the metadata crawl, so both proceed at the same time.
+        xml_queue_size : int, optional
+            Maximum number of papers waiting for their XML download. The metadata crawl pauses while the queue
+            is full.
+        cache : ResponseCache, optional
+            Persistent cache of the API pages. Pages of windows ending before today are served from it without
+            calling the API again.
+        api_url : str, optional
+            Root URL of the API, ending with '/'. Defaults to `biorxiv_retriever.API_URL`, it can point to a mirror
+            or a local mock server.
+        stream_pages : bool, optional
+            If True, each page is parsed incrementally while it is downloaded, one record at a time, instead of
+            being downloaded and then parsed. Only effective with the optional dependency `ijson`.
+        xml_storage : str, optional
+            'files' writes one XML file per paper, 'shards' packs them into compressed monthly shards with an
+            offset index by DOI. See `xml_storage`.
         """
         self.cursor = 0
         self.count = 100
+        self.total_articles = 0
+        self._totals = {}
+        self._received = {}
+        self.paper = None
         self.service = "details"
-        self.server = server
+        self.servers = server.split(",") if isinstance(server, str) else list(server)
+        assert self.servers and all(server_ in SERVERS for server_ in self.servers), \
+            f"server must be one or several of {SERVERS}"
+        self.server = ",".join(self.servers)
         self.start_date = start_date
+        self._start_dates: Dict[str, str] = {}
         self.end_date = end_date
-        self.url = f"{BASE_URL}{server}/{start_date}/{end_date}/{str(self.cursor)}/json"
+        self.base_url = f"{api_url}details/"
+        self.url = f"{self.base_url}{self.servers[0]}/{start_date}/{end_date}/{str(self.cursor)}/json"
         self.save_folder = save_folder
-        self.filename = filename
         self.xml = bool(xml)
+        self.xml_workers = max(1, int(xml_workers))
+        self.xml_queue_size = xml_queue_size
+        assert xml_storage in STORAGES, f"xml_storage must be one of {STORAGES}"
+        self.xml_storage = xml_storage
+        self.xml_downloader = None
+        self.xml_stats = None
+        self.cache = cache
+        self.stream_pages = stream_pages
+        assert output_format in ["json", "jsonl"], "output_format must be 'json' or 'jsonl'"
+        self.output_format = output_format
+        self.filename = filename or f"biorxiv_data_generator.{output_format}"
+        if not self.filename.endswith(f".{output_format}"):
+            logging.warning(f"The {output_format} output is written to {self.filename}, whose extension differs")
+        self.checkpoint = bool(checkpoint)
+        self.sync = bool(sync)
+        assert shard is None or shard in FREQUENCIES, f"shard must be one of {FREQUENCIES}"
+        self.shard = shard
+        self.shard_workers = max(1, int(shard_workers))
+        assert dedup in POLICIES, f"dedup must be one of {POLICIES}"
+        self.dedup = dedup
+        self.deduplicator = Deduplicator(dedup)
+        self.workers = max(1, int(workers))
+        threads = self.workers * self.shard_workers * len(self.servers) + (self.xml_workers if self.xml else 0)
+        self.session = get_session(pool_size=pool_size or threads)
         if email:
             self.headers = {
                             "From": f"{email}",
@@ -70,83 +194,271 @@ class BiorxivDataGenerator:
         """Will call the Biorxiv API as many times as necessary to generate a json file with the
         metadata of all the papers found by the search parameters.
         It writes the data as a `json` object to the specified `self.save_folder` at class instantiation.
-        :returns `dict`
+        With `output_format='jsonl'` the data is streamed to a JSON Lines file instead.
+        :returns `dict` with the papers keyed by DOI, or with the version kept for each DOI for 'jsonl'.
         """
-        dataset = {}
-        while self.count == 100:
-            self.url = f"{BASE_URL}{self.server}/{self.start_date}/{self.end_date}/{self.cursor}/json"
-            self.data_retriever = BiorxivRequester(self.url, self.headers)
-            response = self.data_retriever()
-            self.total_articles = response['messages'][0]['total']
-            self.count = response['messages'][0]['count']
-            print(f"""Calling entry number {self.cursor} from a total of {self.total_articles}. Progress of {round(100 * self.cursor / self.total_articles, 2)}%""", end='\r')
-            for paper in response['collection']:
-                dataset = self._remove_duplicates(dataset, paper)
+        output = join(self.save_folder, self.filename)
+        existing = self.sync and path.exists(output)
+        self.deduplicator = Deduplicator(self.dedup)
+        self._totals, self._received = {}, {}
+        get_metrics().start_crawl()
+        dataset, writer = None, None
+        if self.output_format == "json":
+            dataset = {}
+            if existing:
+                with open(output) as fp:
+                    dataset = json.load(fp)
+                for paper in dataset.values():
+                    self.deduplicator.accept(paper)
+                self._sync_start_dates(dataset.values())
+        elif existing:
+            self._sync_start_dates(read_jsonl(output))
+
+        checkpoint = self._open_checkpoint()
+        resumed = checkpoint is not None and checkpoint.resumed
+        if self.output_format == "jsonl":
+            writer = JsonlWriter(output, append=resumed or existing, policy=self.dedup)
+        else:
+            if checkpoint is not None:
+                if resumed:
+                    for paper in read_jsonl(f"{output}.partial.jsonl"):
+                        dataset = self._remove_duplicates(dataset, paper)
+                writer = JsonlWriter(f"{output}.partial.jsonl", append=resumed, policy=self.dedup)
+
+        if self.xml:
+            self._start_xml_pipeline()
+        crawled = False
+        try:
+            if self.xml and resumed:
+                # Pages are checkpointed once their papers are queued, so the XML of a resumed crawl may be
+                # missing for any of them. Papers already downloaded are skipped by the downloader.
+                for paper in read_jsonl(writer.filename):
+                    self.xml_downloader.submit(paper)
+            for window, cursor, response in self._iter_windows(checkpoint if resumed else None):
+                papers = response['collection']
+                if dataset is not None:
+                    for paper in papers:
+                        dataset = self._remove_duplicates(dataset, paper)
+                if writer is not None:
+                    writer.write(papers)
                 if self.xml:
-                    self._dl_source_xml(paper)
+                    for paper in papers:
+                        self.xml_downloader.submit(paper)
+                if papers:
+                    self.paper = papers[-1]
+                if checkpoint is not None:
+                    checkpoint.mark(window, cursor, self._totals[window])
+            crawled = True
+        finally:
+            if self.xml:
+                self.xml_stats = self.xml_downloader.close(cancel=not crawled)
 
-            self.cursor += 100
-        self.paper = paper
-        self._write_file(dataset)
+        if self.output_format == "jsonl":
+            writer.compact()
+            dataset = writer.versions
+        else:
+            self._write_file(dataset)
+            if writer is not None:
+                writer.close()
+                os.remove(writer.filename)
+        if checkpoint is not None:
+            checkpoint.remove()
+        get_metrics().tick(force=True)
 
         return dataset
 
+    def _sync_start_dates(self, papers: Iterable[dict]) -> None:
+        """Sets the start date of every server to its latest posting date in `papers`, or leaves it at
+        `self.start_date` if it has none. With a single server, records without a 'server' field count for it.
+        `self.start_date` becomes the earliest of them."""
+        last_dates = {}
+        for paper in papers:
+            server = (paper.get("server") or self.servers[0]).lower() if len(self.servers) > 1 else self.servers[0]
+            if paper["date"] > last_dates.get(server, ""):
+                last_dates[server] = paper["date"]
+        for server in self.servers:
+            self._start_dates[server] = last_dates.get(server, self.start_date)
+            logging.info(f"Syncing {server} from {self._start_dates[server]}")
+        self.start_date = min(self._start_dates.values())
+
+    def _open_checkpoint(self) -> Checkpoint:
+        """Returns the checkpoint of this crawl, or None if checkpointing is disabled."""
+        if not self.checkpoint:
+            return None
+        if not path.exists(self.save_folder):
+            os.makedirs(self.save_folder)
+        params = {"server": self.server, "start_date": self.start_date, "end_date": self.end_date,
+                  "output_format": self.output_format, "shard": self.shard, "dedup": self.dedup}
+        return Checkpoint(join(self.save_folder, f"{self.filename}.checkpoint"), params)
+
+    def _windows(self, server: str) -> List[Tuple[str, str]]:
+        """Returns the date windows crawled on `server`, as (start_date, end_date) tuples."""
+        start_date = self._start_dates.get(server, self.start_date)
+        if self.shard:
+            return split_date_range(start_date, self.end_date, self.shard)
+        return [(start_date, self.end_date)]
+
+    def _window_id(self, server: str, start_date: str, end_date: str) -> str:
+        """Returns the identifier of a window in the progress and the checkpoint, 'start_date/end_date',
+        prefixed with 'server/' when crawling several servers."""
+        if len(self.servers) > 1:
+            return f"{server}/{start_date}/{end_date}"
+        return f"{start_date}/{end_date}"
 
-    @staticmethod
-    def _remove_duplicates(history: dict, new: dict) -> dict:
+    def _iter_windows(self, checkpoint: Checkpoint = None) -> Iterator[Tuple[str, int, dict]]:
+        """Yields the window, cursor and API response of every page to fetch.
+        With several servers, each one is crawled in its own thread and their pages are yielded as they
+        arrive, so the crawl takes the time of the longest one.
+        Parameters
+        ----------
+        checkpoint : Checkpoint, optional
+            Checkpoint of an interrupted crawl. Pages already completed are not fetched again."""
+        if len(self.servers) == 1:
+            yield from self._iter_server(self.servers[0], checkpoint)
+            return
+        yield from merge_iterators([self._iter_server(server, checkpoint) for server in self.servers],
+                                   queue_size=2 * self.workers * self.shard_workers)
+
+    def _iter_server(self, server: str, checkpoint: Checkpoint = None) -> Iterator[Tuple[str, int, dict]]:
+        """Yields the window, cursor and API response of every page to fetch on `server`, window after window.
+        With `self.shard_workers > 1` several windows are crawled concurrently. Their pages are still yielded
+        in window order, so the output is the same as in a serial crawl."""
+        windows = []
+        for start_date, end_date in self._windows(server):
+            window = self._window_id(server, start_date, end_date)
+            cursor, total = 0, 0
+            if checkpoint is not None:
+                cursor, total = checkpoint.next_cursor(window), checkpoint.totals.get(window, 0)
+                self._totals[window] = total
+            windows.append((window, server, start_date, end_date, cursor, total))
+
+        if self.shard_workers == 1:
+            for window, *args in windows:
+                for cursor, response in self._iter_pages(*args):
+                    yield window, cursor, response
+            return
+
+        def crawl_window(window_args: tuple) -> Tuple[str, list]:
+            window, *args = window_args
+            return window, list(self._iter_pages(*args))
+
+        for window, pages in ordered_map(crawl_window, windows, self.shard_workers):
+            for cursor, response in pages:
+                yield window, cursor, response
+
+    def _iter_pages(self, server: str, start_date: str, end_date: str, cursor: int = 0,
+                    total: int = 0) -> Iterator[Tuple[int, dict]]:
+        """Yields the cursor and API response of every page of a date window from `cursor` on, in cursor order.
+        The first page is always fetched alone to learn the total number of articles. With `self.workers > 1`
+        the remaining pages are then fetched concurrently.
+        Parameters
+        ----------
+        server : str
+            Server crawled, 'biorxiv' or 'medrxiv'.
+        start_date : str
+            Start of the window, YYYY-MM-DD format.
+        end_date : str
+            End of the window, YYYY-MM-DD format.
+        cursor : int, optional
+            First cursor to fetch.
+        total : int, optional
+            Total number of articles of the window, if known from a previous crawl. Nothing is fetched if
+            `cursor` is already past it."""
+        if total and cursor >= total:
+            return
+        response = self._fetch_page(server, start_date, end_date, cursor)
+        total, count = self._update_progress(server, start_date, end_date, cursor, response)
+        yield cursor, response
+
+        if self.workers == 1:
+            while count == 100:
+                cursor += 100
+                response = self._fetch_page(server, start_date, end_date, cursor)
+                total, count = self._update_progress(server, start_date, end_date, cursor, response)
+                yield cursor, response
+            return
+
+        def fetch(page_cursor: int) -> Tuple[int, dict]:
+            return page_cursor, self._fetch_page(server, start_date, end_date, page_cursor)
+
+        for cursor, response in ordered_map(fetch, range(cursor + 100, total, 100), self.workers):
+            self._update_progress(server, start_date, end_date, cursor, response)
+            yield cursor, response
+
+    def _fetch_page(self, server: str, start_date: str, end_date: str, cursor: int) -> dict:
+        """Returns the API response for the page of the window of `server` starting at `cursor`."""
+        url = f"{self.base_url}{server}/{start_date}/{end_date}/{cursor}/json"
+        return BiorxivRequester(url, self.headers, session=self.session, allow_empty=True, cache=self.cache,
+                                closed=ResponseCache.is_closed(end_date), stream=self.stream_pages)()
+
+    def _update_progress(self, server: str, start_date: str, end_date: str, cursor: int,
+                         response: dict) -> Tuple[int, int]:
+        """Updates the crawl state with the page just received and prints the progress.
+        :returns the total number of articles of the window and the number of articles in the page."""
+        total = int(response['messages'][0].get('total', 0))
+        count = int(response['messages'][0].get('count', 0))
+        window = self._window_id(server, start_date, end_date)
+        self._totals[window] = total
+        self._received[window] = cursor + count
+        self.total_articles = sum(self._totals.values())
+        self.url = f"{self.base_url}{server}/{start_date}/{end_date}/{cursor}/json"
+        self.cursor = cursor + 100
+        self.count = count
+        metrics = get_metrics()
+        metrics.inc("pages_total")
+        metrics.inc("records_total", count)
+        metrics.progress(sum(self._received.values()), self.total_articles)
+        metrics.tick()
+        eta = metrics.gauge("eta_seconds")
+        print(f"""Calling entry number {cursor} from a total of {total} ({server} {start_date} to {end_date}). Progress of {round(100 * cursor / max(total, 1), 2)}%, {round(metrics.gauge("records_per_second"))} records/s, ETA {timedelta(seconds=round(eta))}""", end='\r')
+        return total, count
+
+    def _remove_duplicates(self, history: dict, new: dict) -> dict:
         """
         Given a dictionary with a history of papers and a new paper to be added to history,
-        it will add the paper. In case the paper already exists, it will overwrite it in case
-        the version is older than the version in history.
+        it will add the paper if the deduplication policy keeps it. With the default 'latest' policy an
+        existing paper is overwritten only by a newer version. Lookups go through the constant-time
+        index of `self.deduplicator`, which must describe `history`.
         """
-        if new["doi"] not in list(history.keys()):
-            history[new["doi"]] = new
-        else:
-            if int(new["version"]) > int(history[new["doi"]]["version"]):
-                history[new["doi"]] = new
-            else:
-                pass
+        if self.deduplicator.accept(new):
+            history[self.deduplicator.key(new)] = new
         return history
 
     def _write_file(self, data: dict) -> None:
-        """Writes data into a json file in the self.data_folder provided at class instantiation."""
+        """Writes data into a json file in the self.data_folder provided at class instantiation.
+        The file is written to a temporary file renamed in place, so an interrupted write never destroys the
+        dataset being synced."""
         if not path.exists(self.save_folder):
             os.makedirs(self.save_folder)
 
-        with open(join(self.save_folder, self.filename), "w") as fp:
+        filename = join(self.save_folder, self.filename)
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w") as fp:
             json.dump(data, fp)
+        os.replace(tmp_filename, filename)
 
-    def dl_source_xml(self, json_: str) -> None:
+    def dl_source_xml(self, json_: str, skip_existing: bool = True) -> Counter:
         """Similar to the hidden version. In this case, it takes as argument a json filename
-        with the entire biorxiv records and uses them to download the html data.
+        with the entire biorxiv records and uses them to download the XML data concurrently.
+        Files already downloaded are skipped, so an interrupted download can be restarted.
         Parameters
         ----------
-        : json_ : str, Filename containing the json object with the paper metadata."""
-
-        file_ = open(json_)
-        dict_ = json.load(file_)
-        count_ = 0
-        for id_, paper in dict_.items():
-            print(f"""Downloading paper {count_} from a total of {len(list(dict_.items()))}. Progress of {round(100 * count_ / len(list(dict_.items())), 2)}%""", end='\r')
-            self._dl_source_xml(paper)
-            count_ += 1
-
-    def _dl_source_xml(self, paper: dict) -> None:
-        """Writes data into a json file in the self.data_folder provided at class instantiation."""
-        xml_folder = join(self.save_folder, "xml")
-        if not path.exists(xml_folder):
-            os.makedirs(xml_folder)
-
-        source_url = paper.get("jatsxml", None)
-        if source_url:
-            if not source_url.startswith(SOURCE_URL_BASE):
-                source_url = SOURCE_URL_BASE + source_url
-            logging.info(f"Downloading source text data for {paper['doi']} ")
-            try:
-                r = requests.get(source_url, allow_redirects=True)
-                open(f"{join(xml_folder, paper['doi'].replace('/','-'))}.xml", 'wb').write(r.content)
-            except requests.exceptions.ConnectionError:
-                logging.warning(f"{paper['doi']} has generated a ConnectionError and has not been downloaded")
+        : json_ : str, Filename containing the json object, or JSON Lines records, with the paper metadata.
+        : skip_existing : bool, If False, files on disk are requested again, conditionally to their ETag and
+                          Last-Modified validators, and rewritten only if they changed.
+        :returns `Counter` with the number of papers per download outcome."""
+        papers = read_records(json_)
+        downloader = XmlDownloader(self.save_folder, workers=self.xml_workers, session=self.session,
+                                   skip_existing=skip_existing, headers=self.headers, storage=self.xml_storage)
+        return downloader(papers, verbose=True)
+
+    def _start_xml_pipeline(self) -> None:
+        """Starts the XML downloader consuming the papers submitted while the metadata pages are fetched,
+        so metadata paging never waits for the full-text downloads."""
+        if self.xml_downloader is None:
+            self.xml_downloader = XmlDownloader(self.save_folder, workers=self.xml_workers, session=self.session,
+                                                headers=self.headers, storage=self.xml_storage)
+        self.xml_downloader.start(queue_size=self.xml_queue_size)
 
     def __str__(self):
         return f"""
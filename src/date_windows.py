@@ -0,0 +1,44 @@
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import List, Tuple
+
+FREQUENCIES = ["month", "week"]
+
+
+def split_date_range(start_date: str, end_date: str, freq: str = "month") -> List[Tuple[str, str]]:
+    """Splits an inclusive date range into consecutive, non-overlapping sub-windows.
+    Monthly windows follow calendar months, weekly windows are 7-day blocks counted from `start_date`.
+    A leading or trailing window of a single day, e.g. when the range starts on the last day of a month, is
+    merged into its neighbour, since the API expects `start_date` to be prior to `end_date`.
+    Parameters
+    ----------
+    start_date : str
+        YYYY-MM-DD format.
+    end_date : str
+        YYYY-MM-DD format.
+    freq : str, optional
+        'month' or 'week'.
+
+    Usage:
+    ```python
+    split_date_range('2022-01-15', '2022-03-10')
+    # [('2022-01-15', '2022-01-31'), ('2022-02-01', '2022-02-28'), ('2022-03-01', '2022-03-10')]
+    ```
+    """
+    assert freq in FREQUENCIES, f"freq must be one of {FREQUENCIES}"
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    windows = []
+    while start <= end:
+        if freq == "month":
+            window_end = start.replace(day=monthrange(start.year, start.month)[1])
+        else:
+            window_end = start + timedelta(days=6)
+        window_end = min(window_end, end)
+        windows.append([start, window_end])
+        start = window_end + timedelta(days=1)
+    if len(windows) > 1 and windows[0][0] == windows[0][1]:
+        windows[0][0] = windows.pop(0)[0]
+    if len(windows) > 1 and windows[-1][0] == windows[-1][1]:
+        windows[-1][1] = windows.pop()[1]
+    return [(str(window_start), str(window_end)) for window_start, window_end in windows]
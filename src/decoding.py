@@ -0,0 +1,95 @@
+from importlib.util import find_spec
+import json
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterator, Union
+
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# `ijson` is only imported by the functions streaming a document, its import costs more than a short CLI run.
+HAS_IJSON = find_spec("ijson") is not None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses a JSON document with `orjson` if it is installed, and the standard `json` module otherwise.
+    Bytes are parsed directly, without decoding them to a string first. Invalid documents raise
+    `json.JSONDecodeError` with both backends."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializes `obj` to UTF-8 encoded JSON, with `orjson` if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def decode_response(response: "requests.Response", stream: bool = False) -> dict:
+    """Parses the body of an API response exactly once. With `stream`, for a response requested with
+    `stream=True`, the page is parsed incrementally from the connection with `parse_page`, so the body is never
+    held in memory as a whole."""
+    if not stream or not HAS_IJSON:
+        return loads(response.content)
+    response.raw.decode_content = True
+    return parse_page(response.raw)
+
+
+def parse_page(fp: BinaryIO) -> dict:
+    """Parses an API page from a binary file-like object. With `ijson` installed the records of its
+    'collection' are built one at a time as the document is read, keeping the transient memory to a single
+    record instead of the whole body. Otherwise the document is read and parsed at once."""
+    if not HAS_IJSON:
+        return loads(fp.read())
+    import ijson
+    page, key, builder, path = {}, None, None, None
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == path and event in ("end_map", "end_array"):
+                if path == "collection.item":
+                    page["collection"].append(builder.value)
+                else:
+                    page[key] = builder.value
+                builder = None
+        elif prefix == "" and event == "map_key":
+            key = value
+        elif prefix == "collection" and key == "collection" and event in ("start_array", "end_array"):
+            page.setdefault("collection", [])
+        elif event in ("start_map", "start_array") and prefix in (key, "collection.item"):
+            builder, path = ijson.ObjectBuilder(), prefix
+            builder.event(event, value)
+        elif prefix == key:
+            page[key] = value
+    return page
+
+
+def iter_records(fp: BinaryIO) -> Iterator[dict]:
+    """Lazily yields the paper records of a JSON dataset file: an object keyed by DOI, as written by
+    `BiorxivDataGenerator`, a saved API page with a 'collection', or a list of records. With `ijson` installed
+    the file is streamed, so a dataset of several hundred MB is never loaded at once."""
+    if not HAS_IJSON:
+        data = loads(fp.read())
+        if isinstance(data, dict) and isinstance(data.get("collection"), list):
+            yield from data["collection"]
+        else:
+            yield from data.values() if isinstance(data, dict) else data
+        return
+    import ijson
+    first = fp.read(1)
+    while first.isspace():
+        first = fp.read(1)
+    fp.seek(fp.tell() - 1)
+    if first == b"[":
+        yield from ijson.items(fp, "item", use_float=True)
+        return
+    for key, value in ijson.kvitems(fp, "", use_float=True):
+        if key == "collection" and isinstance(value, list):
+            yield from value
+        elif key != "messages":
+            yield value
@@ -0,0 +1,56 @@
+from typing import Dict
+
+POLICIES = ["latest", "first", "all"]
+
+
+class Deduplicator:
+    """
+    Index deciding in constant time whether an incoming paper record is kept.
+    It maps the key of every kept record to its version, so it stays small compared to the records themselves.
+
+    Policies:
+        * 'latest' - one record per DOI, replaced when a newer version arrives.
+        * 'first' - one record per DOI, the first one seen.
+        * 'all' - one record per DOI and version. Records are keyed as '<doi>v<version>'.
+
+    Usage:
+        ```python
+        dedup = Deduplicator("latest")
+        for paper in response['collection']:
+            if dedup.accept(paper):
+                dataset[dedup.key(paper)] = paper
+        ```
+    """
+    def __init__(self, policy: str = "latest"):
+        """
+        Parameters
+        ----------
+        policy : str, optional
+            'latest', 'first' or 'all'. Defaults to 'latest'.
+        """
+        assert policy in POLICIES, f"policy must be one of {POLICIES}"
+        self.policy = policy
+        self.versions: Dict[str, int] = {}
+
+    def key(self, paper: dict) -> str:
+        """Returns the key identifying `paper` in the deduplicated dataset."""
+        if self.policy == "all":
+            return f"{paper['doi']}v{paper['version']}"
+        return paper["doi"]
+
+    def accept(self, paper: dict) -> bool:
+        """Records `paper` in the index if the policy keeps it. Returns whether it was kept."""
+        key = self.key(paper)
+        version = int(paper["version"])
+        known = self.versions.get(key)
+        if known is None or (self.policy == "latest" and version > known):
+            self.versions[key] = version
+            return True
+        return False
+
+    def is_current(self, paper: dict) -> bool:
+        """Whether `paper` is the version of its key currently kept in the index."""
+        return self.versions.get(self.key(paper)) == int(paper["version"])
+
+    def __len__(self):
+        return len(self.versions)
@@ -0,0 +1,136 @@
+from datetime import date
+import os
+from os import path
+from typing import Iterable, Iterator, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+FORMATS = ["parquet", "arrow"]
+STRING_FIELDS = ["doi", "title", "authors", "author_corresponding", "author_corresponding_institution",
+                 "type", "license", "abstract", "jatsxml"]
+PARTITIONS = ["server", "month"]
+
+
+def schema(format_: str = "parquet") -> "pa.Schema":
+    """Arrow schema of the exported records. `server` and `month` (YYYY-MM of the posting date) are the
+    partition columns. Arrow IPC files cannot hold a different dictionary per batch, so `category` is only
+    dictionary encoded in Parquet."""
+    return pa.schema([("doi", pa.string()),
+                      ("title", pa.string()),
+                      ("authors", pa.string()),
+                      ("author_corresponding", pa.string()),
+                      ("author_corresponding_institution", pa.string()),
+                      ("date", pa.date32()),
+                      ("version", pa.int16()),
+                      ("type", pa.string()),
+                      ("license", pa.string()),
+                      ("category", pa.dictionary(pa.int32(), pa.string()) if format_ == "parquet" else pa.string()),
+                      ("jatsxml", pa.string()),
+                      ("abstract", pa.string()),
+                      ("published", pa.string()),
+                      ("server", pa.string()),
+                      ("month", pa.string())])
+
+
+class ColumnarExporter:
+    """
+    Exports paper records to a columnar Parquet or Arrow IPC dataset. Requires the optional dependency `pyarrow`.
+
+    The dataset is partitioned by server and posting month, as `server=<server>/month=<YYYY-MM>/` folders,
+    so that analyses only read the partitions and columns they need. `date` is a date column, `version` an
+    integer, `category` is dictionary encoded in Parquet and `published` is null for preprints not published yet.
+    Records are converted in batches of `batch_size`, so the whole dataset is never held in memory.
+
+    Usage:
+        ```python
+        exporter = ColumnarExporter("./data/biorxiv-parquet", format_="parquet")
+        exporter(read_records("./data/biorxiv-dataset.jsonl"))
+        table = read_columnar("./data/biorxiv-parquet", columns=["doi", "date", "category"],
+                              filter=ds.field("month") == "2022-05")
+        ```
+    """
+    def __init__(self, save_folder: str = "./data/biorxiv-parquet", format_: str = "parquet",
+                 server: str = "biorxiv", batch_size: int = 50000):
+        """
+        Parameters
+        ----------
+        save_folder : str, optional
+            Root folder of the partitioned dataset. The partitions written replace any previous export of them.
+        format_ : str, optional
+            'parquet' or 'arrow' (Arrow IPC files, read memory-mapped without decoding).
+        server : str, optional
+            Server of the records that do not report one.
+        batch_size : int, optional
+            Number of records converted at once.
+        """
+        assert pa is not None, "ColumnarExporter requires pyarrow: pip install pyarrow"
+        assert format_ in FORMATS, f"format_ must be one of {FORMATS}"
+        self.save_folder = save_folder
+        self.format_ = format_
+        self.server = server
+        self.batch_size = batch_size
+        self.exported = 0
+        self._schema = schema(format_)
+
+    def __call__(self, papers: Iterable[dict]) -> int:
+        """Writes `papers` to the dataset.
+        :returns int with the number of records exported."""
+        self.exported = 0
+        if not path.exists(self.save_folder):
+            os.makedirs(self.save_folder)
+        ds.write_dataset(self._batches(papers), self.save_folder, schema=self._schema,
+                         format="ipc" if self.format_ == "arrow" else "parquet",
+                         partitioning=ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITIONS]), flavor="hive"),
+                         existing_data_behavior="delete_matching",
+                         basename_template="part-{i}." + ("arrow" if self.format_ == "arrow" else "parquet"))
+        return self.exported
+
+    def _batches(self, papers: Iterable[dict]) -> Iterator["pa.RecordBatch"]:
+        batch: List[dict] = []
+        for paper in papers:
+            batch.append(self._row(paper))
+            if len(batch) == self.batch_size:
+                yield self._to_batch(batch)
+                batch = []
+        if batch:
+            yield self._to_batch(batch)
+
+    def _to_batch(self, rows: List[dict]) -> "pa.RecordBatch":
+        self.exported += len(rows)
+        return pa.RecordBatch.from_pylist(rows, schema=self._schema)
+
+    def _row(self, paper: dict) -> dict:
+        row = {field: paper.get(field) for field in STRING_FIELDS}
+        posted = paper.get("date")
+        row["date"] = date.fromisoformat(posted) if posted else None
+        row["version"] = int(paper["version"]) if paper.get("version") not in (None, "") else None
+        row["category"] = paper.get("category") or None
+        row["published"] = None if paper.get("published") in (None, "", "NA") else paper["published"]
+        row["server"] = (paper.get("server") or self.server).lower()
+        row["month"] = posted[:7] if posted else "unknown"
+        return row
+
+
+def read_columnar(save_folder: str, columns: List[str] = None, filter=None, format_: str = "parquet") -> "pa.Table":
+    """Reads an exported dataset memory-mapped, loading only `columns` from the partitions matching `filter`.
+    Parameters
+    ----------
+    save_folder : str
+        Root folder of the dataset written by `ColumnarExporter`.
+    columns : list of str, optional
+        Columns to read. Defaults to all of them.
+    filter : pyarrow.dataset.Expression, optional
+        Row filter, e.g. `(ds.field("server") == "medrxiv") & (ds.field("month") >= "2022-01")`.
+        Conditions on the partition columns skip whole folders.
+    format_ : str, optional
+        'parquet' or 'arrow'.
+    """
+    assert pa is not None, "read_columnar requires pyarrow: pip install pyarrow"
+    dataset = ds.dataset(save_folder, format="ipc" if format_ == "arrow" else "parquet", partitioning="hive",
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=columns, filter=filter)
@@ -0,0 +1,156 @@
+import json
+import os
+from os import path
+import sqlite3
+import threading
+from typing import Iterable, List
+from src.decoding import loads
+
+
+class LocalIndex:
+    """
+    Local, queryable index of crawled paper records, stored in a SQLite file.
+
+    Titles, abstracts and authors are indexed for full-text search with FTS5, and posting date, category,
+    server and DOI with B-tree indexes, so the searches are answered offline without calling the API or
+    scanning the dataset file. Each DOI keeps its latest version.
+
+    Usage:
+        ```python
+        index = LocalIndex("./data/biorxiv-index.sqlite")
+        index.add(read_records("./data/biorxiv-dataset.jsonl"))
+        papers = index.search("single cell", category="genomics", start_date="2022-01-01")
+        ```
+    """
+    def __init__(self, filename: str = "./data/biorxiv-index.sqlite"):
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            Path of the SQLite file. The parent folder is created if needed.
+        """
+        folder = path.dirname(filename)
+        if folder and not path.exists(folder):
+            os.makedirs(folder)
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                id INTEGER PRIMARY KEY, doi TEXT NOT NULL UNIQUE, version INTEGER NOT NULL, server TEXT,
+                date TEXT, category TEXT, title TEXT, authors TEXT, abstract TEXT, record TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS papers_date ON papers (date);
+            CREATE INDEX IF NOT EXISTS papers_category ON papers (category, date);
+            CREATE INDEX IF NOT EXISTS papers_server ON papers (server, date);
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, abstract, authors, content='papers', content_rowid='id');
+            CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                INSERT INTO papers_fts (rowid, title, abstract, authors)
+                VALUES (new.id, new.title, new.abstract, new.authors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors)
+                VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors)
+                VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+                INSERT INTO papers_fts (rowid, title, abstract, authors)
+                VALUES (new.id, new.title, new.abstract, new.authors);
+            END;""")
+        self._db.commit()
+
+    def add(self, papers: Iterable[dict], batch_size: int = 10000) -> int:
+        """Indexes `papers`. A DOI already indexed is only replaced by a newer version.
+        :returns int with the number of records read."""
+        count_ = 0
+        batch: List[tuple] = []
+        for paper in papers:
+            batch.append((paper["doi"], int(paper["version"]), (paper.get("server") or "").lower() or None,
+                          paper.get("date"), paper.get("category"), paper.get("title"), paper.get("authors"),
+                          paper.get("abstract"), json.dumps(paper)))
+            if len(batch) == batch_size:
+                count_ += self._insert(batch)
+                batch = []
+        if batch:
+            count_ += self._insert(batch)
+        return count_
+
+    def _insert(self, rows: List[tuple]) -> int:
+        with self._lock:
+            self._db.executemany("""
+                INSERT INTO papers (doi, version, server, date, category, title, authors, abstract, record)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doi) DO UPDATE SET version = excluded.version, server = excluded.server,
+                    date = excluded.date, category = excluded.category, title = excluded.title,
+                    authors = excluded.authors, abstract = excluded.abstract, record = excluded.record
+                WHERE excluded.version > papers.version""", rows)
+            self._db.commit()
+        return len(rows)
+
+    def search(self, text: str = "", author: str = "", category: str = "", start_date: str = "",
+               end_date: str = "", doi_prefix: str = "", server: str = "", limit: int = 100) -> List[dict]:
+        """Returns the records matching all the criteria given, best full-text matches first when `text` or
+        `author` is set and latest posting date first otherwise.
+        Parameters
+        ----------
+        text : str, optional
+            FTS5 query over title, abstract and authors, e.g. 'crispr AND "gene drive"'.
+        author : str, optional
+            Words that must all appear in the authors.
+        category : str, optional
+            Exact category, e.g. 'neuroscience'.
+        start_date : str, optional
+            Earliest posting date (YYYY-MM-DD).
+        end_date : str, optional
+            Latest posting date (YYYY-MM-DD).
+        doi_prefix : str, optional
+            Beginning of the DOI, e.g. '10.1101/2022.05'.
+        server : str, optional
+            'biorxiv' or 'medrxiv'.
+        limit : int, optional
+            Maximum number of records returned.
+        """
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        if doi_prefix:
+            conditions.append("doi >= ? AND doi < ?")
+            params += [doi_prefix, doi_prefix + "\uffff"]
+        if server:
+            conditions.append("server = ?")
+            params.append(server.lower())
+        match = " AND ".join(query for query in [f"({text})" if text else "", _column_query("authors", author)]
+                             if query)
+        if match:
+            query = f"""SELECT papers.record FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid
+                        WHERE {' AND '.join(["papers_fts MATCH ?"] + conditions)}
+                        ORDER BY papers_fts.rank LIMIT ?"""
+            params = [match] + params + [limit]
+        else:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"SELECT record FROM papers {where} ORDER BY date DESC LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _column_query(column: str, words: str) -> str:
+    """FTS5 query requiring every word of `words` in `column`, each quoted so it is not read as syntax."""
+    tokens = ['"' + word.replace('"', '""') + '"' for word in words.split()]
+    return f"{column} : ({' '.join(tokens)})" if tokens else ""
@@ -0,0 +1,247 @@
+from bisect import bisect_left
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREFIX = "biorxiv"
+HELP = {"request_duration_seconds": "Duration of the HTTP requests, retries and body download included.",
+        "requests_total": "HTTP requests completed, by final status.",
+        "request_errors_total": "HTTP requests that raised a connection or timeout error after their retries.",
+        "retries_total": "Retries of HTTP requests, by reason.",
+        "rate_limit_wait_seconds_total": "Time spent waiting for the client-side rate limiter.",
+        "response_bytes_total": "Bytes of response bodies downloaded.",
+        "pages_total": "API pages received by the crawl.",
+        "records_total": "Paper records received by the crawl.",
+        "xml_downloads_total": "XML full texts processed, by outcome.",
+        "records_per_second": "Records received per second since the crawl started.",
+        "expected_records": "Records the crawl expects to receive in total.",
+        "eta_seconds": "Estimated seconds until the crawl is complete.",
+        "cpu_utilization": "Process CPU time over wall time since the metrics were reset."}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, as in Prometheus."""
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile. As in Prometheus, the last finite bound is returned
+        for values above it."""
+        rank, seen = q * self.count, 0
+        for bound, count_ in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count_
+            if seen >= rank and count_:
+                return min(bound, self.buckets[-1])
+        return 0.0
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "p50": self.quantile(0.5), "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts))}
+
+
+class Metrics:
+    """
+    Thread-safe registry of the crawl instrumentation: request latency histograms, status counts, retries,
+    time waited for the rate limiter, bytes downloaded, pages, records, XML outcomes, records/sec and ETA.
+    The requester, the data generator, the XML downloader and the async client all report to the registry of
+    the process returned by `get_metrics`.
+
+    Comparing the time waited for the rate limiter and the retries with the request latency and the CPU
+    utilization tells whether a slow crawl is throttled by the API, bound by the network or by the CPU.
+
+    Hooks registered with `add_hook` receive `snapshot()` at most every `interval` seconds while the crawl
+    runs, e.g. to log it or to write it for a Prometheus textfile collector with `dump`.
+
+    Usage:
+        ```python
+        metrics = get_metrics()
+        metrics.add_hook(lambda snapshot: print(snapshot["records_per_second"]), interval=10)
+        metrics.add_hook(lambda snapshot: metrics.dump("./data/crawl.prom"), interval=15)
+        BiorxivDataGenerator(workers=8)()
+        print(metrics.to_json())
+        ```
+    """
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Parameters
+        ----------
+        buckets : tuple of float, optional
+            Upper bounds in seconds of the request latency histograms.
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hooks: List[List] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears every metric and restarts the clocks of the rates and the ETA."""
+        with self._lock:
+            self._counters: Dict[str, Dict[Labels, float]] = {}
+            self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+            self._gauges: Dict[str, float] = {}
+            self.started = time.monotonic()
+            self._cpu_started = time.process_time()
+            self._crawl_started = self.started
+            self._crawl_records = 0.0
+
+    def start_crawl(self) -> None:
+        """Restarts the clock of records/sec and the ETA, from the records received so far. Called at the start of
+        each crawl, so a second crawl in the same process does not count the records and time of the first one.
+        The counters are kept."""
+        with self._lock:
+            self._crawl_started = time.monotonic()
+            self._crawl_records = sum(self._counters.get("records_total", {}).values())
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Adds `value` to the counter `name` with `labels`."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Records `value` in the histogram `name` with `labels`."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            if key not in histograms:
+                histograms[key] = Histogram(self.buckets)
+            histograms[key].observe(value)
+
+    def request(self, host: str, status: int, seconds: float, size: int) -> None:
+        """Records a completed HTTP request."""
+        self.observe("request_duration_seconds", seconds, host=host)
+        self.inc("requests_total", host=host, status=str(status))
+        self.inc("response_bytes_total", size, host=host)
+
+    def progress(self, done: int, expected: int) -> None:
+        """Updates records/sec, from the `records_total` counter since `start_crawl`, and the ETA of a crawl that
+        has `done` of the `expected` records. `done` includes the records of a resumed crawl, which do not count
+        in the rate."""
+        with self._lock:
+            elapsed = time.monotonic() - self._crawl_started
+            records = sum(self._counters.get("records_total", {}).values()) - self._crawl_records
+            rate = records / elapsed if elapsed > 0 else 0.0
+            self._gauges["records_per_second"] = rate
+            self._gauges["expected_records"] = expected
+            if rate:
+                self._gauges["eta_seconds"] = max(expected - done, 0) / rate
+
+    def counter(self, name: str, **labels) -> float:
+        """Returns the value of the counter `name`, summed over the labels not given."""
+        with self._lock:
+            return sum(value for key, value in self._counters.get(name, {}).items()
+                       if set(labels.items()) <= set(key))
+
+    def gauge(self, name: str) -> float:
+        with self._lock:
+            return self._gauges.get(name, 0.0)
+
+    def add_hook(self, callback: Callable[[dict], None], interval: float = 10.0) -> None:
+        """Calls `callback(snapshot)` at most every `interval` seconds, from `tick`."""
+        with self._lock:
+            self._hooks.append([callback, interval, 0.0])
+
+    def remove_hooks(self) -> None:
+        with self._lock:
+            self._hooks = []
+
+    def tick(self, force: bool = False) -> None:
+        """Calls the hooks whose interval has passed, or all of them if `force`. Called by the crawl after every
+        page and at its end."""
+        now = time.monotonic()
+        with self._lock:
+            due = [hook for hook in self._hooks if force or now - hook[2] >= hook[1]]
+            for hook in due:
+                hook[2] = now
+        if due:
+            snapshot = self.snapshot()
+            for callback, *_ in due:
+                callback(snapshot)
+
+    def snapshot(self) -> dict:
+        """Returns every metric as a JSON serializable `dict`. Labelled metrics are keyed by their labels
+        joined as 'name=value,name=value'."""
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            snapshot = {"elapsed_seconds": elapsed,
+                        "cpu_utilization": (time.process_time() - self._cpu_started) / elapsed if elapsed else 0.0,
+                        **self._gauges}
+            for name, counters in self._counters.items():
+                snapshot[name] = {_label_string(key): value for key, value in counters.items()}
+            for name, histograms in self._histograms.items():
+                snapshot[name] = {_label_string(key): histogram.snapshot() for key, histogram in histograms.items()}
+        return snapshot
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Returns every metric in the Prometheus text exposition format, prefixed with 'biorxiv_'."""
+        lines = []
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            gauges = {"cpu_utilization": (time.process_time() - self._cpu_started) / elapsed if elapsed else 0.0,
+                      **self._gauges}
+            for name, counters in sorted(self._counters.items()):
+                lines += _header(name, "counter")
+                lines += [f"{PREFIX}_{name}{_label_block(key)} {value}" for key, value in sorted(counters.items())]
+            for name, histograms in sorted(self._histograms.items()):
+                lines += _header(name, "histogram")
+                for key, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count_ in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count_
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append(f"{PREFIX}_{name}_bucket{_label_block(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{PREFIX}_{name}_sum{_label_block(key)} {histogram.sum}")
+                    lines.append(f"{PREFIX}_{name}_count{_label_block(key)} {histogram.count}")
+        for name, value in sorted(gauges.items()):
+            lines += _header(name, "gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename: str) -> None:
+        """Writes the metrics atomically to `filename`, in the Prometheus text format if it ends with '.prom'
+        and as JSON otherwise."""
+        content = self.to_prometheus() if filename.endswith(".prom") else self.to_json()
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w") as fp:
+            fp.write(content)
+        os.replace(tmp_filename, filename)
+
+
+def _label_string(key: Labels) -> str:
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+def _label_block(key: Labels) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+def _header(name: str, type_: str) -> List[str]:
+    return [f"# HELP {PREFIX}_{name} {HELP.get(name, name)}", f"# TYPE {PREFIX}_{name} {type_}"]
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the metrics registry shared by the process."""
+    return _metrics
@@ -1,15 +1,188 @@
+import threading
+import time
 from typing import Dict, List
+from urllib.parse import urlsplit
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
+from src.cache import ResponseCache
+from src.decoding import decode_response
+from src.metrics import get_metrics
 #from . import logger, SCOPUS_API_KEY
 
+THROTTLING_STATUS = (429, 503)
+
+
+class TokenBucket:
+    """Token bucket limiting the request rate to one host. Thread safe.
+    The rate is halved each time the host throttles the client and recovers linearly with successful requests.
+    A Retry-After delay pauses every request to the host until it has passed."""
+    def __init__(self, rate: float, burst: int, min_rate: float, recovery: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns the number of seconds to wait before sending the request."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def throttled(self, retry_after: float = None) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter shared by all the requesters of the process, with one token bucket per host.
+    It adapts to the server: 429 and 503 responses halve the rate of the host and a Retry-After header pauses
+    all its requests, while successful requests slowly bring the rate back to `rate`.
+
+    Usage:
+        ```python
+        limiter = configure_rate_limiter(rate=5, burst=10)
+        limiter.acquire("https://api.biorxiv.org/details/biorxiv/2022-05-01/2022-05-31/0/json")
+        ```
+    """
+    def __init__(self, rate: float = 10, burst: int = 10, min_rate: float = 0.5, recovery: float = 0.01):
+        """
+        Parameters
+        ----------
+        rate : float, optional
+            Maximum number of requests per second to each host.
+        burst : int, optional
+            Number of requests that can be sent at once after a quiet period.
+        min_rate : float, optional
+            Lowest rate the limiter backs off to when throttled.
+        recovery : float, optional
+            Fraction of `rate` recovered after each successful request.
+        """
+        self._lock = threading.Lock()
+        self.configure(rate, burst, min_rate, recovery)
+
+    def configure(self, rate: float = 10, burst: int = 10, min_rate: float = 0.5, recovery: float = 0.01) -> None:
+        """Replaces the settings of the limiter, see `__init__`. The state of every host is reset."""
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self.min_rate = min_rate
+            self.recovery = recovery
+            self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, url_or_host: str) -> TokenBucket:
+        """Returns the token bucket of the host of `url_or_host`, creating it on first use."""
+        host = _host(url_or_host)
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst, self.min_rate, self.recovery)
+            return self._buckets[host]
+
+    def acquire(self, url_or_host: str) -> None:
+        """Blocks until a request to the host of `url_or_host` can be sent."""
+        wait = self.bucket(url_or_host).reserve()
+        if wait > 0:
+            get_metrics().inc("rate_limit_wait_seconds_total", wait, host=_host(url_or_host))
+            time.sleep(wait)
+
+    def throttled(self, url_or_host: str, retry_after: float = None) -> None:
+        """Notifies that the host answered with a throttling status, optionally with a Retry-After delay."""
+        self.bucket(url_or_host).throttled(retry_after)
+
+    def succeeded(self, url_or_host: str) -> None:
+        """Notifies that a request to the host succeeded."""
+        self.bucket(url_or_host).succeeded()
+
+
+def _host(url_or_host: str) -> str:
+    return urlsplit(url_or_host).hostname if "//" in url_or_host else url_or_host
+
+
+class AdaptiveRetry(Retry):
+    """`Retry` that reports throttling responses to a `RateLimiter` and waits for a token before each retry.
+    Every retry is counted in the `retries_total` metric, by status or error."""
+    def __init__(self, *args, rate_limiter: RateLimiter = None, host: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.host = host
+
+    def new(self, **kw):
+        kw.setdefault("rate_limiter", self.rate_limiter)
+        kw.setdefault("host", self.host)
+        return super().new(**kw)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        host = _pool.host if _pool is not None else self.host
+        if self.rate_limiter is not None and host and response is not None and response.status in THROTTLING_STATUS:
+            self.rate_limiter.throttled(host, self.get_retry_after(response))
+        reason = str(response.status) if response is not None else type(error).__name__
+        get_metrics().inc("retries_total", host=host or "", reason=reason)
+        new_retry = super().increment(method=method, url=url, response=response, error=error,
+                                      _pool=_pool, _stacktrace=_stacktrace)
+        new_retry.host = host
+        return new_retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None and self.host:
+            self.rate_limiter.acquire(self.host)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """`HTTPAdapter` waiting for a token of its `RateLimiter`, if any, before sending each request.
+    The duration, final status and body size of each request are recorded in the metrics of the process."""
+    def __init__(self, rate_limiter: RateLimiter = None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = _host(request.url)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(request.url)
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+            # read the body here, as the session would right after, so that its download is timed
+            if kwargs.get("stream"):
+                size = int(response.headers.get("Content-Length", 0))
+            else:
+                size = len(response.content)
+        except requests.exceptions.RequestException as e:
+            get_metrics().inc("request_errors_total", host=host, error=type(e).__name__)
+            raise
+        get_metrics().request(host, response.status_code, time.perf_counter() - start, size)
+        if self.rate_limiter is not None:
+            if response.status_code in THROTTLING_STATUS:
+                self.rate_limiter.throttled(request.url)
+            elif response.status_code < 400:
+                self.rate_limiter.succeeded(request.url)
+        return response
+
 
 def requests_retry_session(
                             retries=4,
                             backoff_factor=0.3,
-                            status_forcelist=(500, 502, 504),
+                            status_forcelist=(429, 500, 502, 503, 504),
                             session=None,
+                            pool_connections=10,
+                            pool_maxsize=10,
+                            rate_limiter=None,
                             ):
     """Creates a resilient session that will retry several times when a query fails.
     from  https://www.peterbe.com/plog/best-practice-with-retries-with-requests
@@ -24,6 +197,14 @@ def requests_retry_session(
     session : requests.Session, optional
         If existing, a valid [`requests.Session` object](https://docs.python-requests.org/en/master/user/advanced/).
         If let to `None` it will create it.
+    pool_connections : int, optional
+        Number of host connection pools to cache, as in `requests.adapters.HTTPAdapter`.
+    pool_maxsize : int, optional
+        Maximum number of connections kept alive per host. Should be at least the number of
+        threads sharing the session, otherwise connections are discarded and re-opened.
+    rate_limiter : RateLimiter, optional
+        If given, every request and retry waits for a token of the limiter, and throttling responses
+        (429, 503) slow the limiter down. Retry-After headers are respected.
 
         Usage:
         ```python
@@ -36,36 +217,116 @@ def requests_retry_session(
         ```
     """
     session = session or requests.Session()
-    retry = Retry(
+    retry = AdaptiveRetry(
         total=retries,
         read=retries,
         connect=retries,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
+        rate_limiter=rate_limiter,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = RateLimitedAdapter(rate_limiter, max_retries=retry, pool_connections=pool_connections,
+                                 pool_maxsize=pool_maxsize)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
 
+DEFAULT_POOL_SIZE = 10
+_shared_rate_limiter = RateLimiter()
+_shared_session = None
+_shared_pool_size = 0
+_shared_session_kwargs = {}
+_shared_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = None) -> requests.Session:
+    """Returns the retry session shared by every requester of the process.
+    It is created on first use. Sharing it keeps the TCP/TLS connections to the API alive between calls
+    instead of opening new ones for each request, and rate limits all of them with `get_rate_limiter`.
+    Parameters
+    ----------
+    pool_size : int, optional
+        Minimum number of connections kept alive per host. If larger than the current pool, the adapters of
+        the shared session are replaced by larger ones, with the retry settings given to `configure_session`.
+        Defaults to `DEFAULT_POOL_SIZE`.
+
+        Usage:
+        ```python
+        session = get_session(pool_size=16)
+        response = session.get(url, headers={"Accept": "application/json"}, timeout=30)
+        ```
+    """
+    global _shared_session, _shared_pool_size
+    with _shared_session_lock:
+        pool_size = max(pool_size or 0, DEFAULT_POOL_SIZE)
+        if _shared_session is None or pool_size > _shared_pool_size:
+            _shared_pool_size = max(pool_size, _shared_pool_size)
+            kwargs = {"rate_limiter": _shared_rate_limiter, **_shared_session_kwargs}
+            _shared_session = requests_retry_session(session=_shared_session, pool_maxsize=_shared_pool_size,
+                                                     **kwargs)
+        return _shared_session
+
+
+def configure_session(pool_size: int = DEFAULT_POOL_SIZE, **kwargs) -> requests.Session:
+    """Replaces the shared session by a new one. Requesters created afterwards will use it.
+    Parameters
+    ----------
+    pool_size : int, optional
+        Number of connections kept alive per host.
+    kwargs :
+        Any other argument accepted by `requests_retry_session`, e.g. `retries` or `backoff_factor`.
+    """
+    global _shared_session, _shared_pool_size, _shared_session_kwargs
+    with _shared_session_lock:
+        _shared_pool_size = pool_size
+        _shared_session_kwargs = {key: value for key, value in kwargs.items() if key != "session"}
+        kwargs.setdefault("rate_limiter", _shared_rate_limiter)
+        _shared_session = requests_retry_session(pool_maxsize=pool_size, **kwargs)
+        return _shared_session
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Returns the rate limiter shared by every requester of the process."""
+    return _shared_rate_limiter
+
+
+def configure_rate_limiter(rate: float = 10, burst: int = 10, **kwargs) -> RateLimiter:
+    """Replaces the settings of the shared rate limiter. The shared session keeps using it.
+    Parameters
+    ----------
+    rate : float, optional
+        Maximum number of requests per second to each host.
+    burst : int, optional
+        Number of requests that can be sent at once after a quiet period.
+    kwargs :
+        Any other argument accepted by `RateLimiter`, e.g. `min_rate`.
+    """
+    _shared_rate_limiter.configure(rate=rate, burst=burst, **kwargs)
+    return _shared_rate_limiter
+
+
 class Service:
     """Parent class to setup HTTP services.
     """
     REST_URL: str = ''
     HEADERS: Dict[str, str] = {}
 
-    def __init__(self):
-        self.retry_request = requests_retry_session()
-        self.retry_request.headers.update(self.HEADERS)
+    def __init__(self, session: requests.Session = None):
+        self.retry_request = session or get_session()
+        self.headers = dict(self.HEADERS)
 
 
 class BiorxivRequester(Service):
     """
     Generates resilient calls to [biorxiv API](https://api.biorxiv.org/)
     """
-    def __init__(self, url: str, headers: Dict[str, str]):
-        Service.__init__(self)
+    NO_RESULTS = "no posts found"
+
+    def __init__(self, url: str, headers: Dict[str, str], session: requests.Session = None,
+                 allow_empty: bool = False, cache: ResponseCache = None, closed: bool = False,
+                 stream: bool = False):
+        Service.__init__(self, session=session)
         """
         Generates resilient calls to [biorxiv API](https://api.biorxiv.org/)
         Parameters
@@ -74,6 +335,18 @@ class BiorxivRequester(Service):
             URL for the API call to [biorxiv API](https://api.biorxiv.org/)
         headers : dict,
             `dict` containing the headers for the API request. Should include 'From' and 'Accept' as keys.
+        session : requests.Session, optional
+            Session to send the request with. If let to `None` the shared session from `get_session` is used.
+        allow_empty : bool, optional
+            If True, a response reporting that no posts were found is returned, with an empty 'collection',
+            instead of failing the status assertion. Useful when crawling date windows that may be empty.
+        cache : ResponseCache, optional
+            If given, the response is read from the cache when available and stored in it otherwise.
+        closed : bool, optional
+            Whether `url` covers a closed date window, whose response is cached without expiry.
+        stream : bool, optional
+            If True, the page is parsed incrementally while it is downloaded, see `decoding.parse_page`.
+            Otherwise the body is downloaded, then parsed once.
 
         Usage:
         ```python
@@ -87,13 +360,31 @@ class BiorxivRequester(Service):
         ```
         """
         self.url = url
-        self.headers = headers
+        self.headers.update(headers)
+        self.allow_empty = allow_empty
+        self.cache = cache
+        self.closed = closed
+        self.stream = stream
 
     def __call__(self) -> Dict[str, str]:
-        response = self.retry_request.get(self.url)
-        assert response.status_code == 200, f"""problem with biorxiv api ({response.status_code}) with request {self.url}"""
-        assert response.json()['messages'][0]['status'] == 'ok', f"""⚠️ The API request shows no matching results. 
-                                                          {response.json()['messages'][0]['status']} ⚠️, \n{self.url}"""
-        return response.json()
+        if self.cache is not None:
+            response = self.cache.get(self.url)
+            if response is not None:
+                return response
+        response = self._request()
+        if self.cache is not None:
+            self.cache.set(self.url, response, closed=self.closed)
+        return response
+
+    def _request(self) -> Dict[str, str]:
+        with self.retry_request.get(self.url, headers=self.headers, stream=self.stream) as response:
+            assert response.status_code == 200, f"""problem with biorxiv api ({response.status_code}) with request {self.url}"""
+            decoded = decode_response(response, stream=self.stream)
+        status = decoded['messages'][0]['status']
+        if self.allow_empty and status == self.NO_RESULTS:
+            return {**decoded, 'collection': []}
+        assert status == 'ok', f"""⚠️ The API request shows no matching results. 
+                                                          {status} ⚠️, \n{self.url}"""
+        return decoded
 
 
@@ -0,0 +1,68 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from queue import Full, Queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+
+def ordered_map(function: Callable, items: Iterable, workers: int) -> Iterator:
+    """Like `ThreadPoolExecutor.map`, but submits at most `2 * workers` calls ahead of the result being
+    consumed, so the number of results waiting in memory stays bounded. Results are yielded in order."""
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(function, item) for item in islice(items, 2 * workers))
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(items, 1):
+                pending.append(executor.submit(function, item))
+            yield result
+
+
+def merge_iterators(iterables: List[Iterable], queue_size: int = 16) -> Iterator:
+    """Consumes every iterable in its own thread and yields their items as soon as they are produced, so the
+    slowest iterable sets the total time instead of the sum of all of them. At most `queue_size` items wait
+    to be consumed. The first exception raised by an iterable is raised here, after the others have stopped."""
+    queue = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def consume(iterable: Iterable) -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    threads = [threading.Thread(target=consume, args=(iterable,), daemon=True) for iterable in iterables]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            item, error = queue.get()
+            if item is end:
+                running -= 1
+                if error is not None:
+                    raise error
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,148 @@
+import json
+import os
+from os import path
+from typing import BinaryIO, Iterable, Iterator
+from src.decoding import iter_records, loads
+from src.dedup import Deduplicator
+
+
+class JsonlWriter:
+    """
+    Streams paper records to a JSON Lines file, one record per line, as they arrive from the API.
+    Deduplication is handled by a `Deduplicator`, a compact in-memory index mapping each DOI to the version
+    written, so memory grows with the number of DOIs and not with the size of the records.
+
+    With the 'latest' policy a newer version of a paper is appended as a new line. While the crawl is running
+    the file can be read with `read_jsonl`, where the last line of a DOI wins. `compact` rewrites the file
+    keeping only that line.
+
+    Usage:
+        ```python
+        writer = JsonlWriter("./data/biorxiv.jsonl")
+        writer.write(response['collection'])
+        writer.close()
+        ```
+    """
+    def __init__(self, filename: str, append: bool = False, policy: str = "latest"):
+        """
+        Parameters
+        ----------
+        filename : str
+            Path of the JSONL output file. The parent folder is created if needed.
+        append : bool, optional
+            If True, keeps the records already in `filename` and rebuilds the DOI index from them. An incomplete
+            last line left by an interrupted crawl is removed first, so the next record starts on its own line.
+            Otherwise the file is truncated.
+        policy : str, optional
+            Deduplication policy, 'latest', 'first' or 'all'. See `Deduplicator`.
+        """
+        self.filename = filename
+        self.dedup = Deduplicator(policy)
+        self.versions = self.dedup.versions
+        folder = path.dirname(filename)
+        if folder and not path.exists(folder):
+            os.makedirs(folder)
+        if append and path.exists(filename):
+            truncate_partial_line(filename)
+            for paper in read_jsonl(filename):
+                self.dedup.accept(paper)
+        self._fp = open(filename, "a" if append else "w")
+
+    def write(self, papers: Iterable[dict]) -> int:
+        """Appends the papers that are not duplicates of an already written version and flushes the file.
+        :returns int with the number of lines written."""
+        written = 0
+        for paper in papers:
+            if self.dedup.accept(paper):
+                self._fp.write(json.dumps(paper) + "\n")
+                written += 1
+        self._fp.flush()
+        return written
+
+    def close(self) -> None:
+        self._fp.close()
+
+    def compact(self) -> None:
+        """Closes the writer and rewrites the file keeping only the line of the version kept for each key.
+        The file is streamed and replaced atomically, so memory stays bounded by the DOI index. Lines that cannot
+        be parsed, as in `read_jsonl`, are dropped."""
+        self.close()
+        tmp_filename = f"{self.filename}.tmp"
+        kept = set()
+        with open(self.filename) as src, open(tmp_filename, "w") as dst:
+            for line in src:
+                try:
+                    paper = loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = self.dedup.key(paper)
+                if self.dedup.is_current(paper) and key not in kept:
+                    kept.add(key)
+                    dst.write(line)
+        os.replace(tmp_filename, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def truncate_partial_line(filename: str, chunk_size: int = 65536) -> None:
+    """Truncates `filename` just after its last newline, removing the incomplete line an interrupted write
+    may have left at its end. The file is scanned backwards, one chunk at a time."""
+    with open(filename, "rb+") as fp:
+        end = fp.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            fp.seek(start)
+            newline = fp.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            fp.truncate(position)
+
+
+def read_jsonl(filename: str) -> Iterator[dict]:
+    """Yields the records of a JSONL file written by `JsonlWriter`, skipping an incomplete last line
+    left by an interrupted crawl."""
+    with open(filename) as fp:
+        for line in fp:
+            try:
+                yield loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def read_records(filename: str) -> Iterator[dict]:
+    """Yields the records of an output file of `BiorxivDataGenerator` or `BiorxivRetriever`: JSON Lines,
+    a JSON object keyed by DOI, or an API response with a 'collection'. The format is detected from the content,
+    whatever the extension. JSON files are streamed when `ijson` is installed, see `decoding.iter_records`."""
+    with open(filename, "rb") as fp:
+        jsonl = is_jsonl(fp)
+        fp.seek(0)
+        if not jsonl:
+            yield from iter_records(fp)
+            return
+    yield from read_jsonl(filename)
+
+
+def is_jsonl(fp: BinaryIO, max_line: int = 1 << 20) -> bool:
+    """Whether the binary file `fp` holds JSON Lines. It does if its first line is a complete JSON value
+    followed by more content, or a single paper record rather than a dataset keyed by DOI or an API response.
+    An empty file counts as JSON Lines without records. Only the first line is read, up to `max_line` bytes,
+    longer than any record."""
+    line = fp.readline(max_line)
+    if not line:
+        return True
+    try:
+        first = loads(line)
+    except json.JSONDecodeError:
+        return False
+    if fp.read(4096).strip():
+        return True
+    return isinstance(first, dict) and "collection" not in first and \
+        not all(isinstance(value, dict) for value in first.values())
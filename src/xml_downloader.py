@@ -0,0 +1,241 @@
+from collections import Counter
+import json
+import logging
+import os
+from os import path
+from os.path import join
+import queue
+import threading
+from typing import Dict, Iterable
+import requests
+from src.metrics import get_metrics
+from src.requester import get_session
+from src.utils import ordered_map
+from src.xml_storage import open_storage
+
+SOURCE_URL_BASE = 'https://www.biorxiv.org/'
+
+DOWNLOADED = "downloaded"
+SKIPPED = "skipped"
+NOT_MODIFIED = "not modified"
+MISSING = "missing"
+FAILED = "failed"
+
+
+class XmlDownloader:
+    """
+    Downloads the JATS XML full text of papers concurrently, using the shared connection-pooled session.
+
+    With the default 'files' storage, files are written to `save_folder/xml/<doi>.xml` through a temporary file
+    renamed in place, so an interrupted download never leaves a truncated file behind. With the 'shards' storage
+    they are packed into compressed monthly shards with an offset index, see `xml_storage.ShardedStorage`.
+    Papers already stored are skipped, unless the record is a newer version of the paper than the one
+    downloaded, which makes an interrupted run safe to restart. With `skip_existing=False` they are requested
+    again, conditionally to the ETag and Last-Modified validators of the previous download, and only rewritten
+    if they changed.
+
+    It can also run as a pipeline: `start` launches `workers` consumer threads draining a bounded queue that
+    `submit` fills, blocking when the queue is full so that a fast producer cannot run away with the memory.
+
+    Usage:
+        ```python
+        downloader = XmlDownloader("./data", workers=8)
+        stats = downloader(response['collection'])
+
+        downloader.start(queue_size=1000)
+        for paper in papers:
+            downloader.submit(paper)
+        stats = downloader.close()
+        ```
+    """
+    VALIDATORS_FILE = ".validators.json"
+
+    def __init__(self, save_folder: str = "./data", workers: int = 4, session: requests.Session = None,
+                 skip_existing: bool = True, timeout: float = 60, headers: Dict[str, str] = None,
+                 storage: str = "files"):
+        """
+        Parameters
+        ----------
+        save_folder : str, optional
+            Folder where the `xml` sub folder is written.
+        workers : int, optional
+            Number of files downloaded concurrently.
+        session : requests.Session, optional
+            Session for the downloads. Defaults to the shared session from `requester.get_session`.
+        skip_existing : bool, optional
+            If True, papers with a file already on disk are not requested. Otherwise they are requested
+            conditionally and rewritten only if they changed.
+        timeout : float, optional
+            Timeout in seconds of each request.
+        headers : dict, optional
+            Headers sent with each request, e.g. 'From'.
+        storage : str, optional
+            'files', one XML file per paper, or 'shards', compressed monthly shards. See `xml_storage`.
+        """
+        self.xml_folder = join(save_folder, "xml")
+        self.workers = max(1, int(workers))
+        self.session = session or get_session(pool_size=self.workers)
+        self.skip_existing = skip_existing
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.storage = open_storage(self.xml_folder, storage)
+        self._lock = threading.Lock()
+        self._queue = None
+        self._threads = []
+        self._error = None
+        self.stats = Counter()
+        self.validators: Dict[str, Dict[str, str]] = {}
+        validators_file = join(self.xml_folder, self.VALIDATORS_FILE)
+        if path.exists(validators_file):
+            with open(validators_file) as fp:
+                self.validators = json.load(fp)
+
+    def __call__(self, papers: Iterable[dict], verbose: bool = False, total: int = None) -> Counter:
+        """Downloads the XML of `papers` concurrently. `papers` is consumed lazily, so a record file streamed
+        with `writers.read_records` is never loaded at once.
+        Parameters
+        ----------
+        papers : iterable of dict
+            Paper records as returned by the API. Only 'doi' and 'jatsxml' are used.
+        verbose : bool, optional
+            If True, prints the progress.
+        total : int, optional
+            Number of papers, if known, shown in the progress.
+        :returns `Counter` with the number of papers per outcome: 'downloaded', 'skipped', 'not modified',
+                'missing' (no XML url in the record) and 'failed'."""
+        stats = Counter()
+        for count_, status in enumerate(ordered_map(self.download, papers, self.workers), 1):
+            stats[status] += 1
+            get_metrics().inc("xml_downloads_total", status=status)
+            if verbose and total:
+                print(f"""Downloading paper {count_} from a total of {total}. Progress of {round(100 * count_ / total, 2)}%""", end='\r')
+            elif verbose:
+                print(f"""Downloading paper {count_}""", end='\r')
+        self.save_validators()
+        self.storage.close()
+        return stats
+
+    def start(self, queue_size: int = 1000) -> None:
+        """Starts the consumer threads of the pipeline.
+        Parameters
+        ----------
+        queue_size : int, optional
+            Maximum number of papers waiting to be downloaded. `submit` blocks while the queue is full."""
+        assert not self._threads, "The pipeline is already running"
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self.stats = Counter()
+        self._threads = [threading.Thread(target=self._consume, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, paper: dict) -> None:
+        """Queues `paper` for download by the pipeline started with `start`."""
+        self._queue.put(paper)
+
+    def close(self, cancel: bool = False) -> Counter:
+        """Waits for the queued papers to be downloaded and stops the consumer threads.
+        An unexpected error raised while downloading, e.g. a full disk, is raised again here.
+        Parameters
+        ----------
+        cancel : bool, optional
+            If True, the papers still queued are dropped, only the downloads in progress are waited for, and
+            download errors are only logged. Used when the producer failed, so its own error is not delayed
+            or replaced.
+        :returns `Counter` with the number of papers per outcome, see `__call__`."""
+        if cancel:
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.save_validators()
+        self.storage.close()
+        if self._error is not None and not cancel:
+            raise self._error
+        return self.stats
+
+    def _consume(self) -> None:
+        while True:
+            paper = self._queue.get()
+            if paper is None:
+                return
+            try:
+                status = self.download(paper)
+            except Exception as e:
+                logging.exception(f"Unexpected error while downloading {paper.get('doi')}")
+                self._error = self._error or e
+                status = FAILED
+            with self._lock:
+                self.stats[status] += 1
+            get_metrics().inc("xml_downloads_total", status=status)
+
+    def download(self, paper: dict) -> str:
+        """Downloads the XML of a single paper.
+        :returns str with the outcome, see `__call__`."""
+        source_url = paper.get("jatsxml", None)
+        if not source_url:
+            return MISSING
+        if not source_url.startswith(SOURCE_URL_BASE) and not source_url.startswith("http"):
+            source_url = SOURCE_URL_BASE + source_url
+
+        exists = self.storage.exists(paper["doi"])
+        validators = self.validators.get(paper["doi"], {})
+        version = int(paper["version"]) if "version" in paper else None
+        newer_version = version is not None and version > validators.get("version", version)
+        if exists and self.skip_existing and not newer_version:
+            return SKIPPED
+
+        headers = dict(self.headers)
+        if exists and not newer_version:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        logging.info(f"Downloading source text data for {paper['doi']} ")
+        try:
+            r = self.session.get(source_url, headers=headers, allow_redirects=True, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"{paper['doi']} has generated a {type(e).__name__} and has not been downloaded")
+            return FAILED
+        if r.status_code == 304:
+            return NOT_MODIFIED
+        if r.status_code != 200:
+            logging.warning(f"{paper['doi']} returned status {r.status_code} and has not been downloaded")
+            return FAILED
+
+        validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+                      "version": version}
+        with self._lock:
+            previous = self.validators.get(paper["doi"])
+            known_version = (previous or {}).get("version")
+            if version is not None and known_version is not None and version < known_version:
+                return SKIPPED
+            self.validators[paper["doi"]] = {key: value for key, value in validators.items() if value}
+        # The version is recorded first, so a concurrent download of an older version is skipped, and the
+        # storage, safe for concurrent writes, compresses and writes outside of the lock.
+        try:
+            self.storage.write(paper, r.content)
+        except BaseException:
+            with self._lock:
+                if previous is None:
+                    self.validators.pop(paper["doi"], None)
+                else:
+                    self.validators[paper["doi"]] = previous
+            raise
+        return DOWNLOADED
+
+    def save_validators(self) -> None:
+        """Saves the ETag and Last-Modified validators used for conditional requests."""
+        with self._lock:
+            validators = dict(self.validators)
+        tmp_filename = join(self.xml_folder, f"{self.VALIDATORS_FILE}.tmp")
+        with open(tmp_filename, "w") as fp:
+            json.dump(validators, fp)
+        os.replace(tmp_filename, join(self.xml_folder, self.VALIDATORS_FILE))
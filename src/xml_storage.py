@@ -0,0 +1,184 @@
+import gzip
+import os
+from os import path
+from os.path import join
+import threading
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Tuple
+
+STORAGES = ["files", "shards"]
+
+
+class FileStorage:
+    """
+    Stores each XML full text as its own uncompressed `<doi>.xml` file in `xml_folder`.
+    Files are written through a temporary file renamed in place, so an interrupted write never leaves a
+    truncated file behind.
+    """
+    def __init__(self, xml_folder: str):
+        self.xml_folder = xml_folder
+        if not path.exists(xml_folder):
+            os.makedirs(xml_folder)
+
+    def filename(self, doi: str) -> str:
+        """Returns the path where the XML of `doi` is written."""
+        return f"{join(self.xml_folder, doi.replace('/', '-'))}.xml"
+
+    def exists(self, doi: str) -> bool:
+        return path.exists(self.filename(doi))
+
+    def write(self, paper: dict, content: bytes) -> None:
+        """Writes `content` to a temporary file in the same folder and renames it to the file of the paper.
+        The temporary name is unique to the process and thread, and the file is created with a plain `open`, so
+        its permissions follow the umask."""
+        filename = self.filename(paper["doi"])
+        tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_filename, "wb") as fp:
+                fp.write(content)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            if path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+    def read(self, doi: str) -> bytes:
+        with open(self.filename(doi), "rb") as fp:
+            return fp.read()
+
+    def __iter__(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields the DOI and XML of every paper stored. DOIs are recovered from the file names, assuming the
+        DOI prefix has no '-'."""
+        for name in sorted(os.listdir(self.xml_folder)):
+            if name.endswith(".xml"):
+                with open(join(self.xml_folder, name), "rb") as fp:
+                    yield name[:-len(".xml")].replace("-", "/", 1), fp.read()
+
+    def close(self) -> None:
+        pass
+
+
+class Entry(NamedTuple):
+    shard: str
+    offset: int
+    length: int
+    version: int
+
+
+class ShardedStorage:
+    """
+    Packs the XML full texts into one compressed shard per posting month, `<YYYY-MM>.xml.gz`, instead of one
+    file per paper, which keeps the number of files small and typically shrinks the corpus several times.
+
+    Each full text is appended to its shard as an independent gzip member, and its offset and length are
+    appended to the index of the shard, `<YYYY-MM>.idx`, a tab separated file of DOI, version, offset and
+    length. A single paper is read by seeking to its member, and a shard is still a valid gzip file that
+    `zcat` streams as a whole. A newer version of a paper is appended and its index line supersedes the
+    previous one. Data is flushed before the index line is written, so an interrupted write at worst leaves
+    unreferenced bytes at the end of the shard.
+
+    Usage:
+        ```python
+        storage = ShardedStorage("./data/xml")
+        storage.write(paper, content)
+        xml = storage.read("10.1101/2022.05.04.490589")
+        for doi, xml in storage:
+            ...
+        ```
+    """
+    INDEX_SUFFIX = ".idx"
+    SHARD_SUFFIX = ".xml.gz"
+
+    def __init__(self, xml_folder: str, compresslevel: int = 6):
+        """
+        Parameters
+        ----------
+        xml_folder : str
+            Folder of the shards and their indexes.
+        compresslevel : int, optional
+            gzip compression level, from 1 (fastest) to 9 (smallest).
+        """
+        self.xml_folder = xml_folder
+        self.compresslevel = compresslevel
+        if not path.exists(xml_folder):
+            os.makedirs(xml_folder)
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[BinaryIO, BinaryIO]] = {}
+        self.index: Dict[str, Entry] = {}
+        for name in sorted(os.listdir(xml_folder)):
+            if name.endswith(self.INDEX_SUFFIX):
+                self._load_index(name[:-len(self.INDEX_SUFFIX)])
+
+    def _load_index(self, shard: str) -> None:
+        shard_filename = join(self.xml_folder, f"{shard}{self.SHARD_SUFFIX}")
+        size = path.getsize(shard_filename) if path.exists(shard_filename) else 0
+        with open(join(self.xml_folder, f"{shard}{self.INDEX_SUFFIX}")) as fp:
+            for line in fp:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 4:
+                    continue
+                doi, version, offset, length = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+                known = self.index.get(doi)
+                if offset + length <= size and (known is None or version >= known.version):
+                    self.index[doi] = Entry(shard, offset, length, version)
+
+    @staticmethod
+    def shard(paper: dict) -> str:
+        """Returns the shard of `paper`, the month of its posting date."""
+        return paper.get("date", "")[:7] or "undated"
+
+    def exists(self, doi: str) -> bool:
+        return doi in self.index
+
+    def write(self, paper: dict, content: bytes) -> None:
+        """Appends the compressed `content` to the shard of `paper` and records it in the index."""
+        member = gzip.compress(content, compresslevel=self.compresslevel)
+        shard = self.shard(paper)
+        version = int(paper.get("version", 0))
+        with self._lock:
+            data, index = self._open(shard)
+            data.seek(0, os.SEEK_END)
+            offset = data.tell()
+            data.write(member)
+            data.flush()
+            index.write(f"{paper['doi']}\t{version}\t{offset}\t{len(member)}\n")
+            index.flush()
+            self.index[paper["doi"]] = Entry(shard, offset, len(member), version)
+
+    def _open(self, shard: str) -> Tuple[BinaryIO, BinaryIO]:
+        if shard not in self._files:
+            self._files[shard] = (open(join(self.xml_folder, f"{shard}{self.SHARD_SUFFIX}"), "ab"),
+                                  open(join(self.xml_folder, f"{shard}{self.INDEX_SUFFIX}"), "a"))
+        return self._files[shard]
+
+    def read(self, doi: str) -> bytes:
+        """Returns the XML of `doi`, reading only its member of the shard."""
+        entry = self.index[doi]
+        with open(join(self.xml_folder, f"{entry.shard}{self.SHARD_SUFFIX}"), "rb") as fp:
+            fp.seek(entry.offset)
+            return gzip.decompress(fp.read(entry.length))
+
+    def shards(self) -> List[str]:
+        return sorted({entry.shard for entry in self.index.values()})
+
+    def __iter__(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields the DOI and XML of every paper stored, shard after shard, reading each shard sequentially."""
+        for shard in self.shards():
+            entries = sorted((entry.offset, entry.length, doi) for doi, entry in self.index.items()
+                             if entry.shard == shard)
+            with open(join(self.xml_folder, f"{shard}{self.SHARD_SUFFIX}"), "rb") as fp:
+                for offset, length, doi in entries:
+                    fp.seek(offset)
+                    yield doi, gzip.decompress(fp.read(length))
+
+    def close(self) -> None:
+        with self._lock:
+            for data, index in self._files.values():
+                data.close()
+                index.close()
+            self._files = {}
+
+
+def open_storage(xml_folder: str, storage: str = "files"):
+    """Returns the XML storage backend `storage`, 'files' or 'shards', for `xml_folder`."""
+    assert storage in STORAGES, f"storage must be one of {STORAGES}"
+    return ShardedStorage(xml_folder) if storage == "shards" else FileStorage(xml_folder)
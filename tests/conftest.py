@@ -0,0 +1,11 @@
+import pytest
+from benchmarks.mock_server import MockBiorxivServer
+from src.requester import configure_rate_limiter
+
+
+@pytest.fixture(scope="session")
+def mock_api():
+    """Local mock of the API serving 1000 papers, about 600 records per server, posted during 2021."""
+    configure_rate_limiter(rate=1e6, burst=1000)
+    with MockBiorxivServer(papers=1000, duplicate_rate=0.2) as server:
+        yield server
@@ -0,0 +1,154 @@
+import json
+import os
+
+import pytest
+from benchmarks.mock_server import MockBiorxivServer
+from src.dataset_generator import BiorxivDataGenerator
+from src.writers import JsonlWriter, read_records, truncate_partial_line
+from src.xml_storage import FileStorage
+
+START_DATE = "2021-01-01"
+END_DATE = "2021-12-31"
+
+
+def expected_records(mock_api: MockBiorxivServer, servers=("biorxiv",), start_date: str = START_DATE,
+                     end_date: str = END_DATE) -> dict:
+    """Returns the latest version of every paper of `servers` posted between the dates, keyed by DOI."""
+    papers = {}
+    for paper in mock_api.records:
+        if paper["server"] in servers and start_date <= paper["date"] <= end_date:
+            known = papers.get(paper["doi"])
+            if known is None or int(paper["version"]) > int(known["version"]):
+                papers[paper["doi"]] = paper
+    return papers
+
+
+def crawl(mock_api, save_folder, generator=BiorxivDataGenerator, **kwargs) -> dict:
+    """Runs a crawl against `mock_api` and returns the records of its output file, keyed by DOI."""
+    kwargs = {"start_date": START_DATE, "end_date": END_DATE, "filename": "papers.json", **kwargs}
+    datagen = generator(api_url=mock_api.api_url, save_folder=str(save_folder), **kwargs)
+    datagen()
+    return {paper["doi"]: paper for paper in read_records(os.path.join(save_folder, datagen.filename))}
+
+
+class FailingGenerator(BiorxivDataGenerator):
+    """Raises on the `fail_on`-th page fetched, as an API failure or Ctrl-C would."""
+    fail_on = 4
+
+    def _fetch_page(self, *args):
+        self.fetched = getattr(self, "fetched", 0) + 1
+        if self.fetched == self.fail_on:
+            raise RuntimeError("injected failure")
+        return super()._fetch_page(*args)
+
+
+def test_serial_crawl_matches_corpus(mock_api, tmp_path):
+    assert crawl(mock_api, tmp_path) == expected_records(mock_api)
+
+
+@pytest.mark.parametrize("kwargs", [dict(workers=4),
+                                    dict(shard="month", shard_workers=3),
+                                    dict(shard="week", workers=2, shard_workers=2),
+                                    dict(workers=4, output_format="jsonl", filename="papers.jsonl")])
+def test_concurrent_crawl_matches_serial(mock_api, tmp_path, kwargs):
+    serial = crawl(mock_api, tmp_path / "serial")
+    assert crawl(mock_api, tmp_path / "concurrent", **kwargs) == serial
+
+
+def test_concurrent_json_output_keeps_serial_order(mock_api, tmp_path):
+    serial = crawl(mock_api, tmp_path / "serial")
+    assert list(crawl(mock_api, tmp_path / "concurrent", workers=4)) == list(serial)
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_multi_server_crawl_merges_both_servers(mock_api, tmp_path, output_format):
+    filename = f"papers.{output_format}"
+    merged = crawl(mock_api, tmp_path / "both", server=["biorxiv", "medrxiv"], workers=2,
+                   output_format=output_format, filename=filename)
+    biorxiv = crawl(mock_api, tmp_path / "biorxiv", output_format=output_format, filename=filename)
+    medrxiv = crawl(mock_api, tmp_path / "medrxiv", server="medrxiv", output_format=output_format,
+                    filename=filename)
+    assert biorxiv and medrxiv
+    assert merged == {**biorxiv, **medrxiv}
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+@pytest.mark.parametrize("kwargs", [dict(), dict(shard="month", workers=2)])
+def test_checkpoint_resumes_after_failure(mock_api, tmp_path, output_format, kwargs):
+    kwargs = dict(checkpoint=True, output_format=output_format, filename=f"papers.{output_format}", **kwargs)
+    with pytest.raises(RuntimeError):
+        crawl(mock_api, tmp_path, generator=FailingGenerator, **kwargs)
+    assert os.path.exists(tmp_path / f"papers.{output_format}.checkpoint")
+
+    assert crawl(mock_api, tmp_path, **kwargs) == expected_records(mock_api)
+    assert sorted(os.listdir(tmp_path)) == [f"papers.{output_format}"]
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_checkpoint_resume_downloads_all_xml(mock_api, tmp_path, output_format):
+    kwargs = dict(checkpoint=True, xml=True, xml_workers=2, output_format=output_format,
+                  filename=f"papers.{output_format}")
+    with pytest.raises(RuntimeError):
+        crawl(mock_api, tmp_path, generator=FailingGenerator, **kwargs)
+
+    papers = crawl(mock_api, tmp_path, **kwargs)
+    storage = FileStorage(str(tmp_path / "xml"))
+    assert papers == expected_records(mock_api)
+    assert [doi for doi in papers if not storage.exists(doi)] == []
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_sync_merges_new_papers(mock_api, tmp_path, output_format):
+    kwargs = dict(output_format=output_format, filename=f"papers.{output_format}")
+    crawl(mock_api, tmp_path, end_date="2021-06-15", **kwargs)
+    assert crawl(mock_api, tmp_path, sync=True, **kwargs) == expected_records(mock_api)
+
+
+def test_sync_resumes_each_server_from_its_own_date(mock_api, tmp_path):
+    servers = ["biorxiv", "medrxiv"]
+    crawl(mock_api, tmp_path, server=servers, end_date="2021-06-15")
+    crawl(mock_api, tmp_path / "medrxiv", server="medrxiv", end_date="2021-09-15")
+    with open(tmp_path / "papers.json") as fp:
+        dataset = json.load(fp)
+    with open(tmp_path / "medrxiv" / "papers.json") as fp:
+        dataset.update(json.load(fp))
+    with open(tmp_path / "papers.json", "w") as fp:
+        json.dump(dataset, fp)
+
+    datagen = BiorxivDataGenerator(server=servers, api_url=mock_api.api_url, save_folder=str(tmp_path),
+                                   start_date=START_DATE, end_date=END_DATE, filename="papers.json", sync=True)
+    datagen()
+    assert datagen._start_dates["biorxiv"] <= "2021-06-15" < datagen._start_dates["medrxiv"] <= "2021-09-15"
+    records = {paper["doi"]: paper for paper in read_records(str(tmp_path / "papers.json"))}
+    assert records == expected_records(mock_api, servers)
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_resume_after_half_written_line(mock_api, tmp_path, monkeypatch, output_format):
+    write = JsonlWriter.write
+    calls = []
+
+    def interrupted_write(self, papers):
+        calls.append(len(papers))
+        if len(calls) == 3:
+            self._fp.write(json.dumps(papers[0])[:40])
+            self._fp.flush()
+            raise KeyboardInterrupt
+        return write(self, papers)
+
+    kwargs = dict(checkpoint=True, output_format=output_format, filename=f"papers.{output_format}")
+    monkeypatch.setattr(JsonlWriter, "write", interrupted_write)
+    with pytest.raises(KeyboardInterrupt):
+        crawl(mock_api, tmp_path, **kwargs)
+    monkeypatch.setattr(JsonlWriter, "write", write)
+
+    assert crawl(mock_api, tmp_path, **kwargs) == expected_records(mock_api)
+    assert sorted(os.listdir(tmp_path)) == [f"papers.{output_format}"]
+
+
+@pytest.mark.parametrize("content, truncated", [(b"", b""), (b"abc", b""), (b"a\nbc", b"a\n"), (b"a\nb\n", b"a\nb\n")])
+def test_truncate_partial_line(tmp_path, content, truncated):
+    filename = tmp_path / "papers.jsonl"
+    filename.write_bytes(content)
+    truncate_partial_line(str(filename), chunk_size=2)
+    assert filename.read_bytes() == truncated